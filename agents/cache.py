@@ -0,0 +1,153 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from agents.instrumentation import get_metrics
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "research_cache.sqlite3")
+
+# Time-to-live in seconds per source; web results go stale faster than papers
+DEFAULT_TTLS = {
+    "web": 6 * 60 * 60,
+    "papers": 24 * 60 * 60,
+    "llm": 7 * 24 * 60 * 60,
+    "llm_similar": 7 * 24 * 60 * 60,  # Near-duplicate index over cached LLM responses
+}
+FALLBACK_TTL = 60 * 60
+
+
+class ResultCache:
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, memory_size: int = 256,
+                 max_disk_entries: int = 5000, ttls: Optional[Dict[str, float]] = None):
+        """Two-tier (in-process LRU + SQLite) cache for JSON-serializable results.
+
+        Args:
+            path: SQLite file for the disk tier, or None to keep everything in memory
+            memory_size: Maximum number of entries held in the in-process LRU
+            max_disk_entries: Maximum number of entries kept on disk before the
+                least recently used ones are evicted
+            ttls: Per-source time-to-live overrides in seconds
+        """
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._memory: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, source TEXT, value TEXT, "
+                "expires_at REAL, accessed_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(source: str, query: str, **params) -> str:
+        """Build a cache key from the normalized query and the agent parameters.
+
+        Credentials must not be passed in params; they don't change the result.
+        """
+        normalized = " ".join(query.lower().split())
+        payload = json.dumps({"source": source, "query": normalized, "params": params}, sort_keys=True)
+        return f"{source}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, source: str, key: str) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    get_metrics().incr("cache_hits", source=source, tier="memory")
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self._stats["disk_hits"] += 1
+                        get_metrics().incr("cache_hits", source=source, tier="disk")
+                        return value
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._stats["misses"] += 1
+            get_metrics().incr("cache_misses", source=source)
+            return None
+
+    def set(self, source: str, key: str, value: Any):
+        """Store a value using the TTL configured for its source"""
+        now = time.time()
+        expires_at = now + self.ttls.get(source, FALLBACK_TTL)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, source, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, source, json.dumps(value), expires_at, now)
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now: float):
+        """Remove expired rows, then trim to max_disk_entries by last access"""
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        count = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._stats["evictions"] += overflow
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+from io import BytesIO
+import json
+import math
+import multiprocessing
+import threading
+from typing import List, Optional
+
+CHART_TYPES = ("line", "bar", "scatter")
+FORMATS = ("png", "svg")
+
+
+def validate_spec(spec: dict) -> dict:
+    """Check a chart spec, convert y values to floats and fill in defaults.
+
+    Raises:
+        ValueError: If the spec can't be rendered
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Chart spec must be a JSON object")
+    x_data, y_data = spec.get("x_data"), spec.get("y_data")
+    if not isinstance(x_data, list) or not isinstance(y_data, list) or not x_data:
+        raise ValueError("Chart spec needs non-empty 'x_data' and 'y_data' lists")
+    if len(x_data) != len(y_data):
+        raise ValueError(f"'x_data' has {len(x_data)} points but 'y_data' has {len(y_data)}")
+    try:
+        y_data = [float(y) for y in y_data]
+    except (TypeError, ValueError):
+        raise ValueError(f"'y_data' must be numbers, got {y_data!r}")
+    if not all(math.isfinite(y) for y in y_data):
+        raise ValueError("'y_data' must be finite numbers")
+    chart_type = spec.get("type", "line")  # Default to line graph
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unsupported graph type: {chart_type}")
+    return {
+        "title": str(spec.get("title", "Generated Graph")),
+        "x_label": str(spec.get("x_label", "X-axis")),
+        "y_label": str(spec.get("y_label", "Y-axis")),
+        "x_data": x_data,
+        "y_data": y_data,
+        "type": chart_type,
+    }
+
+
+def render_chart(spec: dict, image_format: str = "png", dpi: int = 150) -> bytes:
+    """Render a validated spec to image bytes.
+
+    Uses a standalone Figure on the Agg canvas rather than pyplot, so there is
+    no global state and it is safe to call from worker threads or processes.
+    matplotlib is imported here, on first render, rather than at startup.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if spec["type"] == "line":
+        ax.plot(spec["x_data"], spec["y_data"])
+    elif spec["type"] == "bar":
+        ax.bar([str(x) for x in spec["x_data"]], spec["y_data"])
+    else:
+        ax.scatter(spec["x_data"], spec["y_data"])
+
+    ax.set_title(spec["title"])
+    ax.set_xlabel(spec["x_label"])
+    ax.set_ylabel(spec["y_label"])
+
+    buf = BytesIO()
+    fig.savefig(buf, format=image_format, dpi=dpi, bbox_inches="tight")
+    return buf.getvalue()
+
+
+class ChartRenderer:
+    def __init__(self, max_workers: int = 2, cache_size: int = 64, use_processes: bool = False):
+        """Renders chart specs, optionally in a process pool, and remembers recent renders.
+
+        Pool workers are started with 'spawn', which re-imports the program's
+        __main__ module in every worker. Only turn processes on from an entry
+        point whose top-level code is behind `if __name__ == "__main__":`, or
+        each worker re-runs the whole script, research calls included.
+
+        Args:
+            max_workers: Rendering processes; PNG encoding is CPU-bound
+            cache_size: Number of rendered images kept, keyed by spec, format and dpi
+            use_processes: Render in worker processes instead of on the calling thread
+        """
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self.use_processes = use_processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render_many(self, specs: List[dict], image_format: str = "png", dpi: int = 150) -> List[bytes]:
+        """Render validated specs concurrently, serving repeats from the cache"""
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        keys = [self._key(spec, image_format, dpi) for spec in specs]
+        results: List[Optional[bytes]] = [self._cached(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        if missing:
+            rendered = self._render([specs[i] for i in missing], image_format, dpi)
+            for i, image in zip(missing, rendered):
+                results[i] = image
+                self._store(keys[i], image)
+
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _render(self, specs: List[dict], image_format: str, dpi: int) -> List[bytes]:
+        if self.use_processes:
+            try:
+                pool = self._get_pool()
+                futures = [pool.submit(render_chart, spec, image_format, dpi) for spec in specs]
+                return [future.result() for future in futures]
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                # e.g. a worker was killed, the host forbids new processes, or the
+                # worker failed to bootstrap because __main__ has no main guard
+                print(f"[ChartRenderer] Process pool unavailable, rendering in-thread: {type(e).__name__}: {e}")
+                self.shutdown()
+        return [render_chart(spec, image_format, dpi) for spec in specs]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn avoids forking a process that already runs threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _key(self, spec: dict, image_format: str, dpi: int) -> str:
+        payload = json.dumps({"spec": spec, "format": image_format, "dpi": dpi}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+            return image
+
+    def _store(self, key: str, image: bytes):
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+_default_renderer: Optional[ChartRenderer] = None
+_default_lock = threading.Lock()
+_use_processes = False
+
+
+def enable_process_pool():
+    """Let the process-wide renderer use worker processes.
+
+    Called by the known entry points (batch.py, the Streamlit app and the
+    benchmark), whose __main__ is safe to re-import; see ChartRenderer.
+    Other callers render on the calling thread.
+    """
+    global _use_processes
+    with _default_lock:
+        _use_processes = True
+        if _default_renderer is not None:
+            _default_renderer.use_processes = True
+
+
+def get_default_renderer() -> ChartRenderer:
+    """Process-wide renderer so every GraphAgent shares one worker pool"""
+    global _default_renderer
+    with _default_lock:
+        if _default_renderer is None:
+            _default_renderer = ChartRenderer(use_processes=_use_processes)
+        return _default_renderer
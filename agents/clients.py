@@ -0,0 +1,105 @@
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def _chat_openai(**kwargs) -> Any:
+    # langchain_openai and openai take about a second to import, so they are
+    # loaded on the first client request rather than at startup
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(**kwargs)
+
+
+def _openai(**kwargs) -> Any:
+    from openai import OpenAI
+    return OpenAI(**kwargs)
+
+
+class ClientRegistry:
+    def __init__(self, chat_model_factory: Callable[..., Any] = _chat_openai,
+                 image_client_factory: Callable[..., Any] = _openai,
+                 max_connections: int = 20, timeout: float = 120.0):
+        """Hands out long-lived OpenAI clients keyed by API key and model.
+
+        Building ChatOpenAI or OpenAI is not free, and each instance would
+        otherwise open its own connection pool. Every client made here shares
+        one httpx pool, and the same (key, model, settings) always returns
+        the same client. The OpenAI clients are thread-safe, so one registry
+        can serve every session and worker thread in the process.
+
+        Args:
+            chat_model_factory: Builds chat models (ChatOpenAI by default)
+            image_client_factory: Builds image clients (openai.OpenAI by default)
+            max_connections: Size of the shared HTTP connection pool
+            timeout: Per-request timeout in seconds
+        """
+        self.chat_model_factory = chat_model_factory
+        self.image_client_factory = image_client_factory
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.http_client = None  # Shared httpx.Client, created with the first client
+        self._clients: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def chat_model(self, api_key: str, model: str, temperature: float, **options) -> Any:
+        """Return the shared chat model for this key, model and settings"""
+        key = ("chat", key_fingerprint(api_key), model, temperature, tuple(sorted(options.items())))
+        return self._get_or_create(key, lambda: self.chat_model_factory(
+            model=model,
+            temperature=temperature,
+            openai_api_key=api_key,
+            http_client=self._shared_http_client(),
+            **options
+        ))
+
+    def image_client(self, api_key: str) -> Any:
+        """Return the shared images client for this key"""
+        key = ("images", key_fingerprint(api_key))
+        return self._get_or_create(key, lambda: self.image_client_factory(
+            api_key=api_key, http_client=self._shared_http_client()
+        ))
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+            if self.http_client is not None:
+                self.http_client.close()
+                self.http_client = None
+
+    def _shared_http_client(self) -> Any:
+        # Only called from _get_or_create, which holds the lock
+        if self.http_client is None:
+            import httpx
+            self.http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout,
+            )
+        return self.http_client
+
+    def _get_or_create(self, key: Tuple, create: Callable[[], Any]) -> Any:
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                # Built under the lock so concurrent first requests share one client
+                client = create()
+                self._clients[key] = client
+            return client
+
+
+def key_fingerprint(api_key: str) -> str:
+    """SHA-256 of an API key, for keying state per account without keeping the raw key around"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+_default_registry: Optional[ClientRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_default_registry() -> ClientRegistry:
+    """Process-wide registry shared by agents that aren't given one"""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ClientRegistry()
+        return _default_registry
@@ -1,17 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
 from agents.web_agent import WebResearchAgent
-from agents.paper_agent import PaperResearchAgent
+from agents.paper_agent import ARXIV_CALLS_PER_MINUTE, PaperResearchAgent
 from agents.summary_agent import SummaryAgent
 from agents.image_agent import ImageAgent
+from agents.image_store import ImageStore
 from agents.graph_agent import GraphAgent
+from agents.pipeline import Pipeline, Stage
+from agents.post_variants import variant_grid
+from agents.ranking import SourceRanker
+from agents.cache import ResultCache
+from agents.clients import ClientRegistry, get_default_registry
+from agents.llm_cache import DEFAULT_LLM_CACHE_PATH
+from agents.rate_limit import QuotaManager, RateLimiter, get_default_quota
+from agents.http_client import HttpClient, get_default_client
+from agents.topic_state import TopicStateStore, source_id
+from agents.enrichment import FullTextEnricher
+from agents.instrumentation import get_metrics
+
+# Per-stage timeouts in seconds; a stage that overruns is dropped from the result
+DEFAULT_STAGE_TIMEOUTS = {
+    "web": 30,
+    "papers": 30,
+    "enrich": 20,  # Full-text fetches still running are left to finish in the background
+    "summary": 120,
+    "bundle": 180,  # Fused summary + posts + charts call
+    "posts": 120,
+    "images": 120,
+    "graphs": 90,
+}
+
+# A refresh searches from a day before the last one: arXiv lists papers up to a
+# day after their submission date. Sources seen last time are filtered out.
+REFRESH_OVERLAP_SECONDS = 24 * 3600
 
 class ResearchCoordinator:
-    def __init__(self):
-        # Initialize all the specialized agents
-        self.web_agent = WebResearchAgent()
-        self.paper_agent = PaperResearchAgent()
-        self.summary_agent = SummaryAgent()
-        self.image_agent = ImageAgent()
-        self.graph_agent = GraphAgent()
+    def __init__(self, stage_timeouts: dict = None, max_workers: int = 4,
+                 cache: ResultCache = None, llm_cache: ResultCache = None,
+                 rate_limits: Dict[str, RateLimiter] = None, http: HttpClient = None,
+                 fetch_per_source: int = 10, top_k: int = 8,
+                 chat_model_factory: Callable[..., Any] = None, image_client_factory: Callable[..., Any] = None,
+                 image_store: ImageStore = None, clients: ClientRegistry = None, fused: bool = False,
+                 quota: QuotaManager = None, topic_state: TopicStateStore = None,
+                 enrich: bool = False, enricher: FullTextEnricher = None,
+                 tones: List[str] = None, post_lengths: List[str] = None, cache_similarity: float = None):
+        # Shared search cache so repeated topics skip the network
+        self.cache = cache if cache is not None else ResultCache()
+        # Separate store for LLM responses so they don't evict search results
+        self.llm_cache = llm_cache if llm_cache is not None else ResultCache(
+            path=DEFAULT_LLM_CACHE_PATH, max_disk_entries=2000
+        )
+
+        # Optional per-provider limiters: 'serpapi', 'arxiv', 'openai', 'openai_images'.
+        # arXiv is always limited, to the rate its API terms ask for.
+        rate_limits = rate_limits or {}
+        # Providers without an explicit limiter share one per API key through the
+        # quota manager, which also keeps the usage and cost ledger
+        self.quota = quota or get_default_quota()
+
+        # Generated images are kept on disk by content hash, with resized variants
+        self.image_store = image_store or ImageStore()
+
+        # One pooled HTTP transport for every agent that talks to the network
+        self.http = http or get_default_client()
+
+        # Long-lived OpenAI clients, shared process-wide unless custom factories are
+        # given (benchmarks swap in stand-ins)
+        factories = {}
+        if chat_model_factory:
+            factories["chat_model_factory"] = chat_model_factory
+        if image_client_factory:
+            factories["image_client_factory"] = image_client_factory
+        self.clients = clients or (ClientRegistry(**factories) if factories else get_default_registry())
+
+        # Initialize all the specialized agents.
+        # Over-fetch from each source; the ranker keeps only the top_k best
+        self.web_agent = WebResearchAgent(max_results=fetch_per_source, cache=self.cache,
+                                          rate_limiter=rate_limits.get("serpapi"), http=self.http,
+                                          quota=self.quota)
+        self.paper_agent = PaperResearchAgent(
+            max_results=fetch_per_source, cache=self.cache, http=self.http,
+            rate_limiter=rate_limits.get("arxiv") or RateLimiter(ARXIV_CALLS_PER_MINUTE)
+        )
+        # Off by default: a near-duplicate hit answers with a response written for slightly different sources
+        self.cache_similarity = cache_similarity
+        self.summary_agent = SummaryAgent(cache=self.llm_cache, rate_limiter=rate_limits.get("openai"),
+                                          clients=self.clients, quota=self.quota,
+                                          cache_similarity=cache_similarity)
+        # Image and graph agents are built on first use, so text-only runs
+        # never start their worker pools
+        self._rate_limits = rate_limits
+        # Per-topic seen sources and last summary for refresh(); opened on first use
+        self._topic_state = topic_state
+        # Full text of the kept sources instead of snippets and abstracts; off by default
+        self.enrich = enrich
+        self._enricher = enricher
+        self._image_agent: Optional[ImageAgent] = None
+        self._graph_agent: Optional[GraphAgent] = None
+        self._agents_lock = threading.Lock()
+        self.ranker = SourceRanker(top_k=top_k)
+
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        self.max_workers = max_workers
+        # Fused mode writes the summary, posts and chart specs in one structured LLM call
+        self.fused = fused
+        # Post tones and lengths; more than one combination writes them all concurrently
+        # and ranks the drafts (see SummaryAgent.generate_post_variants)
+        self.tones = list(tones or ["professional"])
+        self.post_lengths = list(post_lengths or ["medium"])
+        # Span timings and counters from every agent; export with to_json_lines() or to_prometheus()
+        self.metrics = get_metrics()
+
+    @property
+    def image_agent(self) -> ImageAgent:
+        with self._agents_lock:
+            if self._image_agent is None:
+                self._image_agent = ImageAgent(rate_limiter=self._rate_limits.get("openai_images"),
+                                               http=self.http, store=self.image_store, clients=self.clients,
+                                               quota=self.quota)
+            return self._image_agent
+
+    @property
+    def graph_agent(self) -> GraphAgent:
+        with self._agents_lock:
+            if self._graph_agent is None:
+                self._graph_agent = GraphAgent(cache=self.llm_cache, rate_limiter=self._rate_limits.get("openai"),
+                                               clients=self.clients, quota=self.quota,
+                                               cache_similarity=self.cache_similarity)
+            return self._graph_agent
+
+    @property
+    def topic_state(self) -> TopicStateStore:
+        with self._agents_lock:
+            if self._topic_state is None:
+                self._topic_state = TopicStateStore()
+            return self._topic_state
+
+    @property
+    def enricher(self) -> FullTextEnricher:
+        with self._agents_lock:
+            if self._enricher is None:
+                self._enricher = FullTextEnricher(http=self.http)
+            return self._enricher
 
     def run(self, topic: str, openai_api_key: str, serp_api_key: str, 
             generate_images: bool, generate_graphs: bool) -> dict:
@@ -25,48 +158,321 @@ class ResearchCoordinator:
             generate_graphs: Whether to generate graphs
             
         Returns:
-            Dictionary containing research results
+            Dictionary containing research results, plus an 'errors' mapping of
+            stages that failed or timed out and were left out. With more than
+            one post tone or length, 'post_variants' holds the ranked drafts.
+
+        Raises:
+            PipelineError: If the summary stage fails
         """
+        with self.metrics.span("coordinator.run", topic=topic):
+            return self._run(topic, openai_api_key, serp_api_key, generate_images, generate_graphs)
+
+    def _run(self, topic: str, openai_api_key: str, serp_api_key: str,
+             generate_images: bool, generate_graphs: bool) -> dict:
         print(f"[ResearchCoordinator] Starting research for topic: {topic}")
+        self._set_api_keys(openai_api_key, serp_api_key, generate_images, generate_graphs)
 
-        # Set API keys for agents that need them
-        self.web_agent.set_api_key(serp_api_key)  # Web agent uses SERP
-        self.summary_agent.set_api_key(openai_api_key)
-        self.image_agent.set_api_key(openai_api_key)
-        self.graph_agent.set_api_key(openai_api_key)
+        # Step 1: Run web and paper research concurrently
+        combined_results, errors = self._research(topic)
+        if not combined_results:
+            return {"summary": "No results found.", "posts": [], "errors": errors}
 
-        # Step 1: Run Web Research
-        web_results = self.web_agent.run(topic)
-        print(f"[ResearchCoordinator] Fetched {len(web_results)} web results.")
+        if self.fused:
+            return self._run_fused(combined_results, errors, generate_images, generate_graphs)
 
-        # Step 2: Run Paper Research
-        paper_results = self.paper_agent.run(topic)
-        print(f"[ResearchCoordinator] Fetched {len(paper_results)} paper results.")
+        # Step 2: Summarize, then fan out posts, images and graphs in parallel
+        return self._generate(lambda: self.summary_agent.summarize(combined_results), errors,
+                              generate_images, generate_graphs)
 
-        # Combine results from both sources
-        combined_results = web_results + paper_results
-        if not combined_results:
-            return {"summary": "No results found.", "posts": []}
+    def refresh(self, topic: str, openai_api_key: str, serp_api_key: str,
+                generate_images: bool = False, generate_graphs: bool = False) -> dict:
+        """Bring a topic up to date, researching and summarizing only what's new.
+
+        The first refresh of a topic is a full run. Later ones search the web
+        and arXiv from the last update, skip sources that were already
+        summarized, and fold the rest into the saved summary. Posts, images
+        and graphs are made from the updated summary. When nothing new turned
+        up, the saved summary is returned without any LLM call.
+
+        Returns:
+            Same shape as run(), plus 'new_sources', the number of sources summarized this time
+
+        Raises:
+            PipelineError: If the summary stage fails
+        """
+        with self.metrics.span("coordinator.refresh", topic=topic) as span:
+            result = self._refresh(topic, openai_api_key, serp_api_key, generate_images, generate_graphs)
+            span["new_sources"] = result["new_sources"]
+            return result
+
+    def _refresh(self, topic: str, openai_api_key: str, serp_api_key: str,
+                 generate_images: bool, generate_graphs: bool) -> dict:
+        started = time.time()
+        state = self.topic_state.get(topic)
+        since = None
+        if state:
+            since = datetime.fromtimestamp(state["updated_at"] - REFRESH_OVERLAP_SECONDS, timezone.utc)
+            print(f"[ResearchCoordinator] Refreshing topic: {topic} (new since {since:%Y-%m-%d %H:%M} UTC)")
+        else:
+            print(f"[ResearchCoordinator] No saved state, starting full research for topic: {topic}")
+        self._set_api_keys(openai_api_key, serp_api_key, generate_images, generate_graphs)
 
-        # Step 3: Summarize the combined results
-        summary = self.summary_agent.summarize(combined_results)
+        seen = state["seen"] if state else set()
+        new_sources, errors = self._research(topic, since, seen)
+        print(f"[ResearchCoordinator] {len(new_sources)} new sources.")
+        get_metrics().incr("refresh_new_sources", len(new_sources))
+        # A failed search may have missed sources, so the next refresh looks back from the old timestamp
+        updated_at = state["updated_at"] if state and errors else started
 
-        # Step 4: Generate LinkedIn Posts
-        posts = self.summary_agent.generate_posts(summary)
+        if not new_sources:
+            if not state:
+                return {"summary": "No results found.", "posts": [], "errors": errors, "new_sources": 0}
+            self.topic_state.save(topic, state["summary"], seen, updated_at)
+            return {"summary": state["summary"], "posts": [], "images": [], "graphs": [],
+                    "errors": errors, "new_sources": 0}
 
-        # Step 5: Generate Images (if enabled)
-        images = []
+        if state:
+            result = self._generate(lambda: self.summary_agent.update_summary(state["summary"], new_sources),
+                                    errors, generate_images, generate_graphs)
+        elif self.fused:
+            result = self._run_fused(new_sources, errors, generate_images, generate_graphs)
+        else:
+            result = self._generate(lambda: self.summary_agent.summarize(new_sources), errors,
+                                    generate_images, generate_graphs)
+
+        seen = seen | {source_id(source) for source in new_sources} - {None}
+        self.topic_state.save(topic, result["summary"], seen, updated_at)
+        result["new_sources"] = len(new_sources)
+        return result
+
+    def _generate(self, summarize: Callable[[], str], errors: dict,
+                  generate_images: bool, generate_graphs: bool) -> dict:
+        """Run the summary stage, then posts, images and graphs from it in parallel.
+
+        Only the summary is required; the rest degrade to empty lists.
+        """
+        stages = [
+            Stage("summary", summarize, timeout=self.stage_timeouts["summary"], required=True),
+            Stage("posts", self._write_posts, deps=["summary"], timeout=self.stage_timeouts["posts"],
+                  default={"posts": []}),
+        ]
         if generate_images:
-            images = self.image_agent.generate_images(summary)
+            stages.append(Stage("images", lambda summary: self.image_agent.generate_and_store(summary),
+                                deps=["summary"], timeout=self.stage_timeouts["images"], default=[]))
+        if generate_graphs:
+            stages.append(Stage("graphs", lambda summary: self.graph_agent.generate_graphs(summary),
+                                deps=["summary"], timeout=self.stage_timeouts["graphs"], default=[]))
+
+        generated, generation_errors = Pipeline(stages, max_workers=self.max_workers).run()
+        errors.update(generation_errors)
+
+        return {
+            "summary": generated["summary"],
+            **generated["posts"],
+            "images": generated.get("images", []),
+            "graphs": generated.get("graphs", []),
+            "errors": errors
+        }
 
-        # Step 6: Generate Graphs (if enabled)
-        graphs = []
+    def _run_fused(self, combined_results: List[dict], errors: dict,
+                   generate_images: bool, generate_graphs: bool) -> dict:
+        """One call for summary, posts and chart specs; images and chart rendering follow in parallel"""
+        max_charts = self.graph_agent.max_charts if generate_graphs else 0
+        stages = [
+            Stage("bundle", lambda: self.summary_agent.generate_bundle(combined_results, tone=self.tones[0],
+                                                                       max_charts=max_charts),
+                  timeout=self.stage_timeouts["bundle"], required=True),
+        ]
+        if not self._reuses_bundle_posts():
+            stages.append(Stage("posts",
+                                lambda bundle: self._write_posts(bundle["summary"], self._bundle_drafts(bundle)),
+                                deps=["bundle"], timeout=self.stage_timeouts["posts"], default={"posts": []}))
+        if generate_images:
+            stages.append(Stage("images", lambda bundle: self.image_agent.generate_and_store(bundle["summary"]),
+                                deps=["bundle"], timeout=self.stage_timeouts["images"], default=[]))
         if generate_graphs:
-            graphs = self.graph_agent.generate_graphs(summary)
+            stages.append(Stage("graphs", lambda bundle: self.graph_agent.render_specs(bundle["charts"]),
+                                deps=["bundle"], timeout=self.stage_timeouts["graphs"], default=[]))
+
+        generated, generation_errors = Pipeline(stages, max_workers=self.max_workers).run()
+        errors.update(generation_errors)
 
         return {
-            "summary": summary,
-            "posts": posts,
-            "images": images,
-            "graphs": graphs
-        }
\ No newline at end of file
+            "summary": generated["bundle"]["summary"],
+            **generated.get("posts", {"posts": generated["bundle"]["posts"]}),
+            "images": generated.get("images", []),
+            "graphs": generated.get("graphs", []),
+            "errors": errors
+        }
+
+    def run_stream(self, topic: str, openai_api_key: str, serp_api_key: str,
+                   generate_images: bool, generate_graphs: bool) -> Iterator[dict]:
+        """Streaming variant of run() for interactive callers.
+
+        Yields event dictionaries, each with a 'type' key:
+            status: {'stage', 'message'} progress update when a stage starts
+                ('research', 'summary', 'posts' or 'media')
+            summary: {'delta'} next chunk of summary text
+            posts: {'posts', 'current'} finished posts and the one being written
+            result: {'result'} final dictionary, same shape as run() returns
+
+        Images and graphs are generated in the background while the posts stream.
+        In fused mode the summary and posts arrive whole, from the single call;
+        so do posts written in several tones or lengths, once they are ranked.
+
+        Raises:
+            RuntimeError: If the OpenAI API key is missing
+        """
+        with self.metrics.span("coordinator.run_stream", topic=topic):
+            yield from self._run_stream(topic, openai_api_key, serp_api_key, generate_images, generate_graphs)
+
+    def _run_stream(self, topic: str, openai_api_key: str, serp_api_key: str,
+                    generate_images: bool, generate_graphs: bool) -> Iterator[dict]:
+        print(f"[ResearchCoordinator] Streaming research for topic: {topic}")
+        self._set_api_keys(openai_api_key, serp_api_key, generate_images, generate_graphs)
+
+        message = "Searching the web and arXiv and reading full text..." if self.enrich else \
+            "Searching the web and arXiv..."
+        yield {"type": "status", "stage": "research", "message": message}
+        combined_results, errors = self._research(topic)
+        if not combined_results:
+            result = {"summary": "No results found.", "posts": [], "errors": errors}
+            yield {"type": "result", "result": result}
+            return
+
+        bundle = None
+        if self.fused:
+            yield {"type": "status", "stage": "summary",
+                   "message": f"Writing summary and posts from {len(combined_results)} sources..."}
+            max_charts = self.graph_agent.max_charts if generate_graphs else 0
+            bundle = self.summary_agent.generate_bundle(combined_results, tone=self.tones[0],
+                                                        max_charts=max_charts)
+            summary = bundle["summary"]
+            yield {"type": "summary", "delta": summary}
+        else:
+            yield {"type": "status", "stage": "summary", "message": f"Summarizing {len(combined_results)} sources..."}
+            summary_parts = []
+            for delta in self.summary_agent.stream_summary(combined_results):
+                summary_parts.append(delta)
+                yield {"type": "summary", "delta": delta}
+            summary = "".join(summary_parts)
+
+        # Start the slow optional stages now so they overlap with post streaming
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="background")
+        background = {}
+        started = time.monotonic()
+        if generate_images:
+            # Runs on the agent's own pool, so a timeout here doesn't lose the stored image
+            background["images"] = self.image_agent.submit(summary)
+        if generate_graphs and bundle:
+            background["graphs"] = executor.submit(self.graph_agent.render_specs, bundle["charts"])
+        elif generate_graphs:
+            background["graphs"] = executor.submit(self.graph_agent.generate_graphs, summary)
+
+        written = {"posts": []}
+        variants = variant_grid(self.tones, self.post_lengths)
+        if bundle and self._reuses_bundle_posts():
+            written["posts"] = bundle["posts"]
+            yield {"type": "posts", "posts": written["posts"], "current": ""}
+        elif bundle or len(variants) > 1:
+            # Variants are ranked once all are written, so they arrive together
+            message = f"Writing {len(variants)} post variants..." if len(variants) > 1 else "Writing LinkedIn posts..."
+            yield {"type": "status", "stage": "posts", "message": message}
+            try:
+                written = self._write_posts(summary, self._bundle_drafts(bundle) if bundle else None)
+            except Exception as e:
+                print(f"[ResearchCoordinator] Post generation failed: {e}")
+                errors["posts"] = f"{type(e).__name__}: {e}"
+            yield {"type": "posts", "posts": written["posts"], "current": ""}
+        else:
+            yield {"type": "status", "stage": "posts", "message": "Writing LinkedIn posts..."}
+            try:
+                for posts, current in self.summary_agent.stream_posts(summary, self.tones[0],
+                                                                      length=self.post_lengths[0]):
+                    written["posts"] = posts
+                    yield {"type": "posts", "posts": posts, "current": current}
+            except Exception as e:
+                print(f"[ResearchCoordinator] Post streaming failed: {e}")
+                errors["posts"] = f"{type(e).__name__}: {e}"
+
+        result = {"summary": summary, **written, "images": [], "graphs": [], "errors": errors}
+        if background:
+            yield {"type": "status", "stage": "media", "message": "Finishing images and graphs..."}
+        try:
+            for name, future in background.items():
+                remaining = self.stage_timeouts[name] - (time.monotonic() - started)
+                try:
+                    result[name] = future.result(timeout=max(0.0, remaining))
+                except FutureTimeoutError:
+                    errors[name] = f"timed out after {self.stage_timeouts[name]}s"
+                except Exception as e:
+                    errors[name] = f"{type(e).__name__}: {e}"
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield {"type": "result", "result": result}
+
+    def _write_posts(self, summary: str, drafts: Optional[List[dict]] = None) -> dict:
+        """Posts in the configured tones and lengths.
+
+        Returns:
+            Dictionary with 'posts' (texts, best first) and, when more than one
+            tone/length combination was written, 'post_variants' (the ranked
+            drafts with 'tone', 'length' and 'score')
+        """
+        variants = variant_grid(self.tones, self.post_lengths)
+        if len(variants) == 1:
+            tone, length = variants[0]
+            return {"posts": self.summary_agent.generate_posts(summary, tone, length=length)}
+        ranked = self.summary_agent.generate_post_variants(summary, self.tones, self.post_lengths, drafts=drafts)
+        return {"posts": [draft["text"] for draft in ranked], "post_variants": ranked}
+
+    def _reuses_bundle_posts(self) -> bool:
+        """Whether the fused call's posts are all that was asked for"""
+        return variant_grid(self.tones, self.post_lengths) == [(self.tones[0], "medium")]
+
+    def _bundle_drafts(self, bundle: dict) -> List[dict]:
+        """The fused call's posts as variant drafts; it writes medium-length posts in the first tone"""
+        if "medium" not in self.post_lengths:
+            return []
+        return [{"text": post, "tone": self.tones[0], "length": "medium"} for post in bundle["posts"]]
+
+    def _set_api_keys(self, openai_api_key: str, serp_api_key: str,
+                      generate_images: bool, generate_graphs: bool):
+        """Set API keys for agents that need them; optional agents only when enabled"""
+        self.web_agent.set_api_key(serp_api_key)  # Web agent uses SERP
+        self.summary_agent.set_api_key(openai_api_key)
+        if generate_images:
+            self.image_agent.set_api_key(openai_api_key)
+        if generate_graphs:
+            self.graph_agent.set_api_key(openai_api_key)
+
+    def _research(self, topic: str, since: Optional[datetime] = None,
+                  seen: Optional[set] = None) -> tuple[List[dict], dict]:
+        """Run web and paper research concurrently, then keep the most relevant results.
+
+        Top results whose id is in seen are dropped after ranking, so a refresh
+        only picks up new sources that rank as well as the ones already used.
+        """
+        research, errors = Pipeline([
+            Stage("web", lambda: self.web_agent.run(topic, since),
+                  timeout=self.stage_timeouts["web"], default=[]),
+            Stage("papers", lambda: self.paper_agent.run(topic, since),
+                  timeout=self.stage_timeouts["papers"], default=[]),
+        ], max_workers=self.max_workers).run()
+        web_results, paper_results = research["web"], research["papers"]
+        print(f"[ResearchCoordinator] Fetched {len(web_results)} web results.")
+        print(f"[ResearchCoordinator] Fetched {len(paper_results)} paper results.")
+
+        # Combine results from both sources, dropping duplicates and weak matches
+        combined_results = web_results + paper_results
+        ranked = self.ranker.rank(topic, combined_results)
+        print(f"[ResearchCoordinator] Kept {len(ranked)} of {len(combined_results)} results after ranking.")
+        if seen:
+            ranked = [source for source in ranked if source_id(source) not in seen]
+
+        # Only the sources that made the cut are worth a full download
+        if self.enrich and ranked:
+            ranked = self.enricher.enrich(ranked, timeout=self.stage_timeouts["enrich"])
+        return ranked, errors
@@ -0,0 +1,281 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from agents.http_client import HttpClient, get_default_client
+from agents.instrumentation import get_metrics
+from agents.rate_limit import RateLimiter
+
+DEFAULT_FULLTEXT_PATH = os.path.join(".cache", "fulltext.sqlite3")
+
+# Requests per minute for hosts with published crawl limits; others get host_calls_per_minute
+HOST_CALLS_PER_MINUTE = {
+    "export.arxiv.org": 20,  # arXiv asks bots for one request every three seconds
+}
+
+# Markup that is never main content
+BOILERPLATE_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form",
+                    "svg", "iframe", "button", "template")
+TEXT_TAGS = ("h1", "h2", "h3", "h4", "p", "li", "blockquote", "pre")
+MIN_PARAGRAPH_CHARS = 40  # Shorter paragraphs (captions, bylines) don't count towards the main block
+MIN_BLOCK_CHARS = 20
+
+_META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w-]+)", re.IGNORECASE)
+
+
+class FullTextEnricher:
+    def __init__(self, http: Optional[HttpClient] = None, path: Optional[str] = DEFAULT_FULLTEXT_PATH,
+                 max_workers: int = 8, per_host: int = 2, host_calls_per_minute: float = 60,
+                 host_limits: Optional[Dict[str, float]] = None,
+                 max_bytes: int = 5_000_000, max_chars: int = 20000, max_pdf_pages: int = 12,
+                 revalidate_after: float = 24 * 60 * 60):
+        """Fetches the pages and PDFs behind search results and extracts their main text.
+
+        Fetches run on a bounded pool. Each host gets at most per_host
+        connections at once and its own rate limiter, so one slow or strict
+        site can't stall the rest or get hammered. Extracted text is kept on
+        disk with the response's ETag / Last-Modified; after revalidate_after
+        seconds a conditional GET checks it, and a 304 reuses the stored text.
+
+        Args:
+            http: Shared HTTP transport
+            path: SQLite file for extracted text, or None to keep it in memory
+            max_workers: Documents fetched and parsed at once
+            per_host: Concurrent requests to any single host
+            host_calls_per_minute: Request rate per host, unless host_limits has one
+            host_limits: Requests per minute by host, merged over HOST_CALLS_PER_MINUTE
+            max_bytes: Larger downloads are cut off and parsed as far as they got
+            max_chars: Characters of extracted text kept per document
+            max_pdf_pages: Pages read from each PDF
+            revalidate_after: Seconds a stored text is used without asking the server
+        """
+        self.http = http or get_default_client()
+        self.per_host = per_host
+        self.host_calls_per_minute = host_calls_per_minute
+        self.host_limits = {**HOST_CALLS_PER_MINUTE, **(host_limits or {})}
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.max_pdf_pages = max_pdf_pages
+        self.revalidate_after = revalidate_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fulltext")
+        self._hosts: Dict[str, Tuple[threading.Semaphore, RateLimiter]] = {}
+        self._lock = threading.Lock()
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fulltext ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, text TEXT, checked_at REAL)"
+        )
+        self._db.commit()
+
+    def enrich(self, sources: List[dict], timeout: Optional[float] = None) -> List[dict]:
+        """Copies of sources with a 'content' field holding the document's main text.
+
+        Sources whose document couldn't be fetched or parsed in time are
+        returned unchanged. Fetches still running at the timeout carry on in
+        the background, so their text is stored for the next run.
+
+        Args:
+            sources: Web results and papers; papers are read from their PDF
+            timeout: Seconds to wait for the whole batch
+        """
+        with get_metrics().span("enrich", sources=len(sources)) as span:
+            futures = {}
+            for i, source in enumerate(sources):
+                url = source.get("pdf_link") or source.get("link")
+                if url:
+                    futures[self._executor.submit(self.fetch_text, url)] = i
+            done, pending = wait(futures, timeout=timeout)
+
+            enriched = [dict(source) for source in sources]
+            for future in done:
+                text = future.result()
+                if text:
+                    enriched[futures[future]]["content"] = text
+            span["enriched"] = sum(1 for source in enriched if source.get("content"))
+            span["timed_out"] = len(pending)
+
+        if pending:
+            print(f"[FullTextEnricher] {len(pending)} documents not ready after {timeout}s; using snippets")
+        return enriched
+
+    def fetch_text(self, url: str) -> Optional[str]:
+        """Main text of the document at url, from the store when it is still fresh.
+
+        Errors are logged and give None, so one bad link never fails a run.
+        """
+        url = _polite_url(url)
+        stored = self._load(url)
+        if stored and time.time() - stored["checked_at"] < self.revalidate_after:
+            get_metrics().incr("fulltext_cache", hit=True)
+            return stored["text"]
+
+        headers = {}
+        if stored and stored["etag"]:
+            headers["If-None-Match"] = stored["etag"]
+        if stored and stored["last_modified"]:
+            headers["If-Modified-Since"] = stored["last_modified"]
+
+        host = urlsplit(url).netloc
+        slots, limiter = self._host(host)
+        try:
+            with slots:
+                response = self.http.get(url, headers=headers, stream=True, rate_limiter=limiter)
+                try:
+                    if response.status_code == 304 and stored:
+                        get_metrics().incr("fulltext_cache", hit=True, revalidated=True)
+                        self._save(url, stored["etag"], stored["last_modified"], stored["text"])
+                        return stored["text"]
+                    response.raise_for_status()
+                    data = self._read(response)
+                    content_type = response.headers.get("Content-Type", "")
+                    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+                finally:
+                    response.close()
+
+            get_metrics().incr("fulltext_cache", hit=False)
+            with get_metrics().span("enrich.extract", host=host) as span:
+                text = self._extract(data, content_type)
+                span["chars"] = len(text or "")
+            if text:
+                self._save(url, etag, last_modified, text)
+            return text
+
+        except Exception as e:
+            print(f"[FullTextEnricher] Could not read {url}: {e}")
+            get_metrics().incr("fulltext_errors", host=host)
+            # An outdated copy still beats the snippet
+            return stored["text"] if stored else None
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _extract(self, data: bytes, content_type: str) -> Optional[str]:
+        if "pdf" in content_type or data.startswith(b"%PDF"):
+            text = extract_pdf_text(data, self.max_pdf_pages)
+        elif "html" in content_type or not content_type:
+            text = extract_main_text(data, _charset(content_type, data))
+        elif content_type.startswith("text/plain"):
+            text = " ".join(data.decode(_charset(content_type, data), errors="replace").split())
+        else:
+            return None  # Images, archives and the like carry no text we can use
+        return text[:self.max_chars] if text else None
+
+    def _read(self, response) -> bytes:
+        """Body up to max_bytes; anything beyond is dropped"""
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=65536):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                break
+        return b"".join(chunks)[:self.max_bytes]
+
+    def _host(self, host: str) -> Tuple[threading.Semaphore, RateLimiter]:
+        with self._lock:
+            if host not in self._hosts:
+                rate = self.host_limits.get(host, self.host_calls_per_minute)
+                self._hosts[host] = (threading.BoundedSemaphore(self.per_host),
+                                     RateLimiter(rate, burst=self.per_host, name=host))
+            return self._hosts[host]
+
+    def _load(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, text, checked_at FROM fulltext WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "text": row[2], "checked_at": row[3]}
+
+    def _save(self, url: str, etag: Optional[str], last_modified: Optional[str], text: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO fulltext (url, etag, last_modified, text, checked_at) "
+                "VALUES (?, ?, ?, ?, ?)", (url, etag, last_modified, text, time.time())
+            )
+            self._db.commit()
+
+
+def extract_main_text(data: bytes, encoding: Optional[str] = None) -> str:
+    """Main content of an HTML page as plain text, one block per line.
+
+    Boilerplate elements are dropped, then the text is taken from <article>
+    or <main> if the page has one, else from the element whose direct
+    paragraphs hold the most text.
+    """
+    from lxml import etree, html  # Only needed once full text is turned on
+
+    parser = html.HTMLParser(encoding=encoding, remove_comments=True)
+    doc = html.document_fromstring(data, parser=parser)
+    etree.strip_elements(doc, *BOILERPLATE_TAGS, with_tail=False)
+
+    candidates = doc.xpath("//article | //main | //*[@role='main']")
+    if candidates:
+        root = max(candidates, key=lambda el: len(el.text_content()))
+    else:
+        scores: dict = {}  # Element -> characters in its direct paragraphs
+        for paragraph in doc.iter("p"):
+            length = len(paragraph.text_content().strip())
+            parent = paragraph.getparent()
+            if length >= MIN_PARAGRAPH_CHARS and parent is not None:
+                scores[parent] = scores.get(parent, 0) + length
+        root = max(scores, key=scores.get) if scores else doc.body if doc.body is not None else doc
+
+    blocks = []
+    for element in root.iter(*TEXT_TAGS):
+        # Text of nested blocks (a <p> inside an <li>) is already in the outer one
+        if any(ancestor.tag in TEXT_TAGS for ancestor in element.iterancestors()):
+            continue
+        text = " ".join(element.text_content().split())
+        if len(text) >= MIN_BLOCK_CHARS:
+            blocks.append(text)
+    if not blocks:
+        return " ".join(root.text_content().split())
+    return "\n".join(blocks)
+
+
+def extract_pdf_text(data: bytes, max_pages: int = 12) -> Optional[str]:
+    """Text of the first max_pages pages of a PDF, or None if pypdf isn't installed"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print("[FullTextEnricher] pypdf is not installed; PDFs keep their abstract")
+        return None
+
+    reader = PdfReader(BytesIO(data))
+    pages = []
+    for page in reader.pages[:max_pages]:
+        text = page.extract_text() or ""
+        if text.strip():
+            pages.append(" ".join(text.split()))
+    return "\n".join(pages) or None
+
+
+def _charset(content_type: str, data: bytes) -> Optional[str]:
+    """Encoding from the Content-Type header or a <meta charset>, else UTF-8"""
+    match = re.search(r"charset=([\w-]+)", content_type, re.IGNORECASE)
+    if match:
+        return match.group(1)
+    match = _META_CHARSET.search(data[:4096])
+    if match:
+        return match.group(1).decode("ascii")
+    return "utf-8"
+
+
+def _polite_url(url: str) -> str:
+    """arXiv asks automated clients to use its export mirror rather than arxiv.org"""
+    parts = urlsplit(url)
+    if parts.netloc in ("arxiv.org", "www.arxiv.org"):
+        return urlunsplit(parts._replace(scheme="https", netloc="export.arxiv.org"))
+    return url
@@ -1,31 +1,62 @@
-from langchain_openai import ChatOpenAI
-import matplotlib.pyplot as plt
 from io import BytesIO
-import json
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
+from agents.cache import ResultCache
+from agents.clients import ClientRegistry, get_default_registry
+from agents.llm_cache import wrapped_chat_model
+from agents.rate_limit import QuotaManager, RateLimiter
+from agents.instrumentation import get_metrics
+from agents.chart_renderer import ChartRenderer, get_default_renderer, validate_spec
+from agents.structured import parse_json
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 class GraphAgent:
-    def __init__(self, model: str = "gpt-4", temperature: float = 0.5):
+    def __init__(self, model: str = "gpt-4", temperature: float = 0.5,
+                 cache: Optional[ResultCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 clients: Optional[ClientRegistry] = None, quota: Optional[QuotaManager] = None,
+                 max_charts: int = 3, dpi: int = 150, image_format: str = "png",
+                 renderer: Optional[ChartRenderer] = None, cache_similarity: Optional[float] = None):
         self.model = model
         self.temperature = temperature
-        self.llm: Optional[ChatOpenAI] = None  # Will be initialized with API key
+        self.max_charts = max_charts  # Upper bound on charts requested per summary
+        self.dpi = dpi
+        self.image_format = image_format  # 'png' or 'svg'
+        self.renderer = renderer or get_default_renderer()  # Loads matplotlib only when rendering
+        self.cache = cache  # Optional LLM response cache
+        self.cache_similarity = cache_similarity  # Reuse responses for near-duplicate summaries
+        self.rate_limiter = rate_limiter  # Optional OpenAI rate limiter
+        self.quota = quota  # Shared per-key limiters, used when no rate_limiter is given
+        self.clients = clients or get_default_registry()  # Shared long-lived chat models
+        self._api_key: Optional[str] = None
+        self.llm: Optional["ChatOpenAI"] = None  # Will be initialized with API key
 
     def set_api_key(self, api_key: str):
-        """Initialize the LLM with the provided API key"""
-        self.llm = ChatOpenAI(
-            model=self.model,
-            temperature=self.temperature,
-            openai_api_key=api_key
-        )
+        """Initialize the LLM with the provided API key.
+
+        The chat model comes from the client registry, so repeat calls are
+        cheap and a key that hasn't changed keeps the existing model.
+        """
+        if self.llm is not None and api_key == self._api_key:
+            return
+        llm = wrapped_chat_model(self.clients, api_key, self.model, self.temperature, "GraphAgent",
+                                 rate_limiter=self.rate_limiter, quota=self.quota,
+                                 cache=self.cache, similarity=self.cache_similarity)
+        # Assigned once fully wrapped, so concurrent runs never see a partial chain
+        self.llm, self._api_key = llm, api_key
 
     def generate_graphs(self, summary: str) -> List[BytesIO]:
         """Generate graphs based on the summary using LangChain and matplotlib.
+
+        A single LLM call returns up to max_charts chart specs, which are
+        rendered in parallel in the renderer's process pool when it has one
+        (see chart_renderer.enable_process_pool), else on this thread.
         
         Args:
             summary: Text summary to base graphs on
             
         Returns:
-            List containing BytesIO objects with graph images
+            List containing BytesIO objects with graph images (PNG or SVG)
             
         Raises:
             RuntimeError: If API key is not set
@@ -38,45 +69,59 @@ class GraphAgent:
         try:
             # Use LangChain to generate graph descriptions
             messages = [
-                {"role": "system", "content": "You are a data visualization expert. Generate graph data in JSON format that can be directly used to create matplotlib graphs. The JSON should include the following fields: 'title', 'x_label', 'y_label', 'x_data', 'y_data', and optionally 'type' (e.g., 'line', 'bar')."},
-                {"role": "user", "content": f"Generate a graph description based on this summary: {summary}"}
+                {"role": "system", "content": (
+                    "You are a data visualization expert. Generate graph data in JSON format that can be "
+                    "directly used to create matplotlib graphs. Return a JSON object with a 'charts' list "
+                    f"of 1 to {self.max_charts} charts. Each chart must include the following fields: "
+                    "'title', 'x_label', 'y_label', 'x_data', 'y_data', and optionally 'type' "
+                    "('line', 'bar' or 'scatter'). Return only the JSON."
+                )},
+                {"role": "user", "content": f"Generate graph descriptions based on this summary: {summary}"}
             ]
             response = self.llm.invoke(messages)
             graph_description = response.content
             print(f"[GraphAgent] Graph description: {graph_description}")
 
-            # Parse the JSON response
-            graph_data = json.loads(graph_description)
+            specs = self.parse_chart_specs(graph_description)
+            if not specs:
+                return []
 
-            # Create the graph dynamically
-            fig, ax = plt.subplots()
-            graph_type = graph_data.get("type", "line")  # Default to line graph
+            return self.render_specs(specs)
+
+        except ValueError as e:
+            print(f"[GraphAgent] Error parsing graph description JSON: {e}")
+            return []
+        except Exception as e:
+            print(f"[GraphAgent] Error generating graphs: {e}")
+            return []
 
-            if graph_type == "line":
-                ax.plot(graph_data["x_data"], graph_data["y_data"])
-            elif graph_type == "bar":
-                ax.bar(graph_data["x_data"], graph_data["y_data"])
-            elif graph_type == "scatter":
-                ax.scatter(graph_data["x_data"], graph_data["y_data"])
-            else:
-                raise ValueError(f"Unsupported graph type: {graph_type}")
+    def render_specs(self, specs: List[dict]) -> List[BytesIO]:
+        """Render already-validated chart specs with the configured format and dpi"""
+        with get_metrics().span("graphs.render", charts=len(specs), format=self.image_format) as span:
+            images = self.renderer.render_many(specs, self.image_format, self.dpi)
+            span["bytes"] = sum(len(image) for image in images)
+        return [BytesIO(image) for image in images]
 
-            # Set graph labels and title
-            ax.set_title(graph_data.get("title", "Generated Graph"))
-            ax.set_xlabel(graph_data.get("x_label", "X-axis"))
-            ax.set_ylabel(graph_data.get("y_label", "Y-axis"))
+    def parse_chart_specs(self, text: str) -> List[dict]:
+        """Extract and validate chart specs from the LLM's JSON answer.
 
-            # Save the graph to a BytesIO object
-            buf = BytesIO()
-            plt.savefig(buf, format="png", dpi=300, bbox_inches='tight')
-            buf.seek(0)
-            plt.close(fig)
+        Accepts {'charts': [...]}, a bare list, or a single chart object, with or
+        without a Markdown code fence or surrounding prose. Invalid charts are skipped.
 
-            return [buf]
+        Raises:
+            ValueError: If the text contains no usable JSON
+        """
+        data = parse_json(text)
 
-        except json.JSONDecodeError as e:
-            print(f"[GraphAgent] Error parsing graph description JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get("charts", [data])
+        if not isinstance(data, list):
             return []
-        except Exception as e:
-            print(f"[GraphAgent] Error generating graphs: {e}")
-            return []
\ No newline at end of file
+
+        specs = []
+        for raw in data[:self.max_charts]:
+            try:
+                specs.append(validate_spec(raw))
+            except ValueError as e:
+                print(f"[GraphAgent] Skipping invalid chart: {e}")
+        return specs
@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from agents.instrumentation import get_metrics
+from agents.rate_limit import RateLimiter, parse_retry_after
+
+# Statuses worth retrying: rate limited or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 20.0):
+        """Shared keep-alive HTTP transport with timeouts and retries.
+
+        Args:
+            pool_size: Connections kept open per host
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            read_timeout: Seconds to wait between bytes of the response
+            max_retries: Extra attempts after a 429/5xx or connection failure
+            backoff_base: First retry delay in seconds; doubles on each attempt
+            backoff_max: Upper bound for a single retry delay
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, rate_limiter: Optional[RateLimiter] = None, **kwargs) -> requests.Response:
+        """GET with retries on 429/5xx and connection errors.
+
+        Keyword arguments are passed to requests; a default timeout is applied
+        when none is given. The last response is returned once retries run out,
+        so callers should still call raise_for_status().
+
+        With a rate_limiter, every attempt (retries included) waits for a slot,
+        and the limiter adapts to 429s and the response's rate-limit headers.
+
+        Raises:
+            requests.exceptions.RequestException: If the final attempt fails to connect
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        metrics = get_metrics()
+
+        with metrics.span("http.get", host=host) as span:
+            for attempt in range(self.max_retries + 1):
+                if rate_limiter:
+                    rate_limiter.acquire()
+                started = time.monotonic()
+                try:
+                    response = self.session.get(url, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    self._record(host, time.monotonic() - started, error=True)
+                    if attempt == self.max_retries:
+                        raise
+                    self._sleep_before_retry(attempt, host)
+                    continue
+
+                self._record(host, time.monotonic() - started, error=response.status_code >= 400)
+                if rate_limiter:
+                    if response.status_code == 429:
+                        rate_limiter.on_rate_limited(parse_retry_after(response.headers.get("Retry-After")))
+                    else:
+                        rate_limiter.update_from_headers(response.headers)
+                        if response.status_code < 400:
+                            rate_limiter.on_success()
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    response.close()
+                    if rate_limiter and response.status_code == 429:
+                        # The limiter now holds this caller (and everyone else) back
+                        self._count_retry(attempt, host, "when the rate limiter allows")
+                        continue
+                    self._sleep_before_retry(attempt, host, response.headers.get("Retry-After"))
+                    continue
+
+                span["status_code"] = response.status_code
+                span["attempts"] = attempt + 1
+                # Streamed bodies haven't been read yet; count what the server announced
+                size = response.headers.get("Content-Length")
+                if not kwargs.get("stream"):
+                    size = len(response.content)
+                if size is not None:
+                    span["bytes"] = int(size)
+                    metrics.incr("http_bytes", int(size), host=host)
+                return response
+
+    def host_stats(self) -> Dict[str, dict]:
+        """Per-host request counts and latency in seconds"""
+        with self._lock:
+            stats = {host: dict(entry) for host, entry in self._stats.items()}
+        for entry in stats.values():
+            entry["avg_latency"] = entry["total_latency"] / entry["requests"] if entry["requests"] else 0.0
+        return stats
+
+    def _sleep_before_retry(self, attempt: int, host: str, retry_after: Optional[str] = None):
+        """Exponential backoff with full jitter, deferring to Retry-After when sent"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        seconds = parse_retry_after(retry_after)
+        if seconds is not None:
+            delay = max(delay, min(seconds, self.backoff_max))
+        self._count_retry(attempt, host, f"in {delay:.2f}s")
+        time.sleep(delay)
+
+    def _count_retry(self, attempt: int, host: str, when: str):
+        with self._lock:
+            self._stats[host]["retries"] += 1
+        get_metrics().incr("http_retries", host=host)
+        print(f"[HttpClient] Retrying {host} {when} (attempt {attempt + 2})")
+
+    def _record(self, host: str, latency: float, error: bool):
+        with self._lock:
+            entry = self._stats.setdefault(host, {
+                "requests": 0, "errors": 0, "retries": 0, "total_latency": 0.0, "max_latency": 0.0
+            })
+            entry["requests"] += 1
+            entry["errors"] += int(error)
+            entry["total_latency"] += latency
+            entry["max_latency"] = max(entry["max_latency"], latency)
+        get_metrics().incr("http_requests", host=host, error=error)
+
+
+_default_client: Optional[HttpClient] = None
+_default_lock = threading.Lock()
+
+
+def get_default_client() -> HttpClient:
+    """Process-wide client shared by every agent, created on first use"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -1,21 +1,37 @@
-from openai import OpenAI
-from typing import List
-import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
 from io import BytesIO
-from PIL import Image
 import base64
+from agents.clients import ClientRegistry, get_default_registry
+from agents.image_store import ImageStore
+from agents.rate_limit import (QuotaManager, RateLimiter, is_rate_limit_error,
+                               retry_after_from_error)
+from agents.http_client import HttpClient, get_default_client
+from agents.instrumentation import get_metrics
 
 class ImageAgent:
-    def __init__(self, model: str = "dall-e-3", quality: str = "standard", size: str = "1024x1024"):
+    def __init__(self, model: str = "dall-e-3", quality: str = "standard", size: str = "1024x1024",
+                 rate_limiter: Optional[RateLimiter] = None, http: Optional[HttpClient] = None,
+                 clients: Optional[ClientRegistry] = None, store: Optional[ImageStore] = None,
+                 max_workers: int = 2, quota: Optional[QuotaManager] = None, max_retries: int = 3):
         self.client = None  # Will be initialized with API key
+        self.clients = clients or get_default_registry()  # Shared long-lived OpenAI clients
+        self.rate_limiter = rate_limiter
+        self.quota = quota  # Shared per-key limiters, used when no rate_limiter is given
+        self.max_retries = max_retries  # Times a rate-limited request is queued again
+        self._limiter: Optional[RateLimiter] = rate_limiter
+        self.http = http or get_default_client()
+        self.store = store  # Local image store; generate_and_store() needs one
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="images")
         self.model = model
         self.quality = quality
         self.size = size
         self.default_num_images = 1  # DALL-E 3 only supports n=1
 
     def set_api_key(self, api_key: str):
-        """Initialize the OpenAI client with the provided API key"""
-        self.client = OpenAI(api_key=api_key)
+        """Initialize the OpenAI client with the provided API key (reused across calls)"""
+        self.client = self.clients.image_client(api_key)
+        self._limiter = self.rate_limiter or (self.quota.limiter("openai_images", api_key) if self.quota else None)
 
     def generate_images(self, summary: str, num_images: int = 1, download: bool = False) -> List[str]:
         """Generate images using OpenAI's DALL-E.
@@ -41,37 +57,96 @@ class ImageAgent:
             if self.model == "dall-e-3":
                 num_images = min(num_images, 1)  # DALL-E 3 only supports n=1
 
-            response = self.client.images.generate(
-                model=self.model,
-                prompt=f"Create a professional, high-quality image illustrating: {summary}. "
-                       "Use a clean, modern style suitable for LinkedIn posts.",
-                n=num_images,
-                quality=self.quality,
-                size=self.size,
-                response_format="url" if not download else "b64_json"
-            )
+            response = self._generate(summary, num_images, download)
+            get_metrics().incr("images_generated", len(response.data), model=self.model)
 
             if download:
-                return [img.b64_json for img in response.data if img.b64_json]
+                # Fall back to the URL if a client ignores response_format
+                return [img.b64_json or img.url for img in response.data if img.b64_json or img.url]
             return [img.url for img in response.data if img.url]
 
         except Exception as e:
             print(f"[ImageAgent] Error generating images: {str(e)}")
             return []
 
+    def _generate(self, summary: str, num_images: int, download: bool):
+        """One images API call, queued behind the rate limiter and requeued on 429"""
+        limiter = self._limiter
+        for attempt in range(self.max_retries + 1):
+            if limiter:
+                limiter.acquire()
+            try:
+                with get_metrics().span("images.generate", model=self.model, n=num_images):
+                    response = self.client.images.generate(
+                        model=self.model,
+                        prompt=f"Create a professional, high-quality image illustrating: {summary}. "
+                               "Use a clean, modern style suitable for LinkedIn posts.",
+                        n=num_images,
+                        quality=self.quality,
+                        size=self.size,
+                        response_format="url" if not download else "b64_json"
+                    )
+            except Exception as e:
+                if not (limiter and is_rate_limit_error(e)) or attempt == self.max_retries:
+                    raise
+                limiter.on_rate_limited(retry_after_from_error(e))
+                continue
+            if limiter:
+                limiter.on_success()
+                limiter.record(model=self.model, images=len(response.data))
+            return response
+
+    def generate_and_store(self, summary: str, num_images: int = 1) -> List[str]:
+        """Generate images and keep their bytes in the local store.
+
+        Images are requested as base64 so there is no second round trip to
+        a short-lived URL. Thumbnail and LinkedIn-sized variants are built
+        in the store's background pool.
+
+        Returns:
+            Image ids for ImageStore.path() / ImageStore.read()
+
+        Raises:
+            RuntimeError: If API key or image store is not set
+        """
+        if not self.store:
+            raise RuntimeError("No image store configured for ImageAgent.")
+
+        image_ids = []
+        for image_data in self.generate_images(summary, num_images, download=True):
+            try:
+                if image_data.startswith("http"):
+                    data = self.download_image(image_data)
+                else:
+                    data = base64.b64decode(image_data)
+                if data:
+                    image_ids.append(self.store.put(data))
+            except Exception as e:
+                print(f"[ImageAgent] Error storing image: {str(e)}")
+        return image_ids
+
+    def submit(self, summary: str, num_images: int = 1) -> Future:
+        """Start generate_and_store() in the background; the future resolves to image ids"""
+        return self._executor.submit(self.generate_and_store, summary, num_images)
+
     def download_image(self, url: str) -> bytes:
         """Download image from URL and return as bytes."""
         try:
-            response = requests.get(url)
+            response = self.http.get(url)
             response.raise_for_status()
             return response.content
         except Exception as e:
             print(f"[ImageAgent] Error downloading image: {str(e)}")
             return None
 
-    def display_image(self, image_data: str):
-        """Display base64 encoded image (for Streamlit or notebooks)."""
+    def display_image(self, image_data: str, variant: str = "original"):
+        """Display a stored image id, URL or base64 encoded image (for Streamlit or notebooks)."""
+        from PIL import Image  # Only needed here, so Pillow stays out of startup
+
         try:
+            if self.store and self.store.has(image_data):
+                # Served from disk: no network round trip
+                return Image.open(self.store.path(image_data, variant))
             if image_data.startswith("http"):
                 img_bytes = self.download_image(image_data)
                 if img_bytes:
@@ -0,0 +1,197 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+from io import BytesIO
+import os
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+from agents.instrumentation import get_metrics
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+DEFAULT_IMAGE_DIR = os.path.join(".cache", "images")
+
+# Variants built for every stored image. 'fit' crops to the exact size (LinkedIn's
+# 1.91:1 link-share ratio); otherwise the image is scaled down to fit inside it.
+DEFAULT_VARIANTS = {
+    "thumbnail": {"size": (320, 320), "format": "WEBP", "quality": 80, "fit": False},
+    "linkedin": {"size": (1200, 627), "format": "JPEG", "quality": 85, "fit": True},
+}
+
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+
+
+class ImageStore:
+    def __init__(self, root: str = DEFAULT_IMAGE_DIR, variants: Optional[Dict[str, dict]] = None,
+                 max_workers: int = 2):
+        """Content-addressed image store with background-built resized variants.
+
+        Images are keyed by the SHA-256 of their bytes, so storing the same
+        image twice is free and a stored image never changes. Variants are
+        written next to the original by a small worker pool; asking for a
+        variant that is still being built waits for it.
+
+        Args:
+            root: Directory the images are kept in
+            variants: Variant name -> {'size', 'format', 'quality', 'fit'}
+            max_workers: Threads resizing and encoding variants (Pillow releases the GIL)
+        """
+        self.root = root
+        self.variants = DEFAULT_VARIANTS if variants is None else variants
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image_store")
+        self._pending: Dict[str, Future] = {}  # image id -> variant job
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, data: bytes) -> str:
+        """Store image bytes and schedule their variants; returns the image id.
+
+        Raises:
+            ValueError: If the bytes are not a PNG, JPEG or WebP image
+        """
+        extension = _sniff_extension(data)
+        if extension is None:
+            raise ValueError("Unsupported image data")
+
+        image_id = hashlib.sha256(data).hexdigest()
+        directory = self._directory(image_id)
+        original = os.path.join(directory, f"original.{extension}")
+        if not os.path.exists(original):
+            os.makedirs(directory, exist_ok=True)
+            _write_atomic(original, data)
+
+        with self._lock:
+            if image_id not in self._pending and not self._variants_ready(image_id):
+                self._pending[image_id] = self._executor.submit(self._build_variants, image_id)
+        return image_id
+
+    def has(self, image_id: str) -> bool:
+        if len(image_id) != 64 or any(c not in "0123456789abcdef" for c in image_id):
+            return False  # Not a SHA-256 hex digest, e.g. a URL
+        return self._original_path(image_id) is not None
+
+    def path(self, image_id: str, variant: str = "original") -> str:
+        """Path of the original or of a variant, waiting for the variant if needed.
+
+        Raises:
+            KeyError: If the image or variant is unknown
+        """
+        original = self._original_path(image_id) if self.has(image_id) else None
+        if original is None:
+            raise KeyError(f"Unknown image: {image_id}")
+        if variant == "original":
+            return original
+        if variant not in self.variants:
+            raise KeyError(f"Unknown image variant: {variant}")
+
+        variant_path = self._variant_path(image_id, variant)
+        if not os.path.exists(variant_path):
+            self.wait([image_id])
+            if not os.path.exists(variant_path):
+                # Stored by an earlier process that exited before building it
+                self._build_variants(image_id)
+        return variant_path
+
+    def read(self, image_id: str, variant: str = "original") -> bytes:
+        with open(self.path(image_id, variant), "rb") as f:
+            return f.read()
+
+    def wait(self, image_ids: Optional[List[str]] = None):
+        """Block until variants of the given images (default: all pending) are written"""
+        with self._lock:
+            if image_ids is None:
+                futures = list(self._pending.values())
+            else:
+                futures = [self._pending[i] for i in image_ids if i in self._pending]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _build_variants(self, image_id: str):
+        from PIL import Image  # Pillow is only loaded once images are in use
+
+        try:
+            with get_metrics().span("images.variants", variants=len(self.variants)) as span:
+                with Image.open(self._original_path(image_id)) as source:
+                    source.load()
+                    image = source.convert("RGB")
+                written = 0
+                for name, options in self.variants.items():
+                    variant_path = self._variant_path(image_id, name)
+                    if os.path.exists(variant_path):
+                        continue
+                    written += _write_atomic(variant_path, _encode_variant(image, options))
+                span["bytes"] = written
+        finally:
+            with self._lock:
+                self._pending.pop(image_id, None)
+
+    def _variants_ready(self, image_id: str) -> bool:
+        return all(os.path.exists(self._variant_path(image_id, name)) for name in self.variants)
+
+    def _directory(self, image_id: str) -> str:
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.root, image_id[:2], image_id)
+
+    def _original_path(self, image_id: str) -> Optional[str]:
+        directory = self._directory(image_id)
+        for extension in EXTENSIONS.values():
+            candidate = os.path.join(directory, f"original.{extension}")
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _variant_path(self, image_id: str, variant: str) -> str:
+        image_format = _variant_format(self.variants[variant])
+        return os.path.join(self._directory(image_id), f"{variant}.{EXTENSIONS[image_format]}")
+
+
+def _variant_format(options: dict) -> str:
+    from PIL import features
+
+    image_format = options.get("format", "JPEG").upper()
+    if image_format == "WEBP" and not features.check("webp"):
+        return "JPEG"  # Pillow built without libwebp
+    return image_format
+
+
+def _encode_variant(image: "Image.Image", options: dict) -> bytes:
+    from PIL import Image, ImageOps
+
+    size = tuple(options["size"])
+    if options.get("fit"):
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+
+    buf = BytesIO()
+    resized.save(buf, format=_variant_format(options), quality=options.get("quality", 85), optimize=True)
+    return buf.getvalue()
+
+
+def _sniff_extension(data: bytes) -> Optional[str]:
+    """File extension from the magic bytes, without decoding the image"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _write_atomic(path: str, data: bytes) -> int:
+    """Write via a temp file and rename, so readers never see a partial image"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(data)
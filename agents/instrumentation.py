@@ -0,0 +1,223 @@
+from collections import deque
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Metrics:
+    def __init__(self, max_spans: int = 10000):
+        """Thread-safe collector for span timings and labelled counters.
+
+        Args:
+            max_spans: Number of finished spans kept for export; older ones are dropped
+        """
+        self._spans: deque = deque(maxlen=max_spans)
+        self._counters: Dict[tuple, float] = {}
+        self._durations: Dict[str, List[float]] = {}  # span name -> [count, sum, max]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Dict[str, Any]]:
+        """Time a block of work.
+
+        Yields the span's attribute dict, so the block can attach results
+        such as token counts or bytes transferred before it finishes.
+        """
+        start = time.time()
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException as e:
+            status = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            record = {
+                "span": name,
+                "start": start,
+                "duration": duration,
+                "status": status,
+                "thread": threading.current_thread().name,
+                **attrs,
+            }
+            with self._lock:
+                self._spans.append(record)
+                stats = self._durations.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Add to a counter, e.g. incr('http_bytes', 512, host='arxiv.org')"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def spans(self) -> List[dict]:
+        with self._lock:
+            return list(self._spans)
+
+    def counters(self) -> Dict[str, float]:
+        """Counters keyed as name{label=value,...}"""
+        with self._lock:
+            items = list(self._counters.items())
+        return {_format_key(name, labels): value for (name, labels), value in items}
+
+    def to_json_lines(self) -> str:
+        """Finished spans followed by a counters record, one JSON object per line"""
+        lines = [json.dumps(span, default=str) for span in self.spans()]
+        lines.append(json.dumps({"counters": self.counters()}))
+        return "\n".join(lines) + "\n"
+
+    def write_json_log(self, path: str):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_json_lines())
+
+    def to_prometheus(self, prefix: str = "research") -> str:
+        """Counters and span durations in the Prometheus text exposition format"""
+        with self._lock:
+            counters = list(self._counters.items())
+            durations = {name: list(stats) for name, stats in self._durations.items()}
+
+        lines = []
+        for (name, labels), value in sorted(counters):
+            lines.append(f"{prefix}_{name}_total{_format_labels(labels)} {value}")
+        for name, (count, total, longest) in sorted(durations.items()):
+            labels = _format_labels((("span", name),))
+            lines.append(f"{prefix}_span_seconds_count{labels} {count}")
+            lines.append(f"{prefix}_span_seconds_sum{labels} {total:.6f}")
+            lines.append(f"{prefix}_span_seconds_max{labels} {longest:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+            self._durations.clear()
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _format_key(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{key}={value}" for key, value in labels) + "}"
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Process-wide collector used by every agent"""
+    return _metrics
+
+
+@contextmanager
+def profile(path: Optional[str] = None) -> Iterator[Optional[cProfile.Profile]]:
+    """Run the block under cProfile and dump stats to path (view with snakeviz or pstats).
+
+    With no path, the RESEARCH_PROFILE environment variable is used; if that is
+    unset too, profiling is skipped. From Python 3.12 cProfile is built on
+    sys.monitoring and sees every thread. Before that it only sees the thread
+    that enables it, so every thread started inside the block (batch workers,
+    pipeline stages, fetch pools) gets its own profiler, and their stats are
+    merged into the dump; threads that already existed are not covered. A
+    sampling profiler (py-spy dump/record) sees everything on any version.
+    """
+    path = path or os.environ.get("RESEARCH_PROFILE")
+    if not path:
+        yield None
+        return
+
+    thread_profilers: List[cProfile.Profile] = []
+    lock = threading.Lock()
+    per_thread = sys.version_info < (3, 12)
+
+    def start_thread_profiler(frame, event, arg):
+        # Runs once in each new thread; enable() replaces this hook with the profiler's own
+        thread_profiler = cProfile.Profile()
+        try:
+            thread_profiler.enable()
+        except Exception as e:
+            # Profiling must never take a worker thread down with it
+            sys.setprofile(None)
+            print(f"[Metrics] Could not profile thread {threading.current_thread().name}: {e}")
+            return
+        with lock:
+            thread_profilers.append(thread_profiler)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # 3.12+ allows one profiler per process; don't fail the run over it
+        print(f"[Metrics] Profiling disabled: {e}")
+        yield None
+        return
+    if per_thread:
+        threading.setprofile(start_thread_profiler)
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(profiler)
+        with lock:
+            for thread_profiler in thread_profilers:
+                thread_profiler.create_stats()
+                if thread_profiler.stats:
+                    stats.add(thread_profiler)
+        stats.dump_stats(path)
+        merged = f" ({len(thread_profilers)} worker threads merged)" if per_thread else ""
+        print(f"[Metrics] Wrote profile to {path}{merged}")
+
+
+class InstrumentedChatModel:
+    def __init__(self, llm, agent: str):
+        """Wrap a chat model to record call latency and token usage per agent"""
+        self.llm = llm
+        self.agent = agent
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def invoke(self, messages, **kwargs):
+        metrics = get_metrics()
+        with metrics.span("llm.invoke", agent=self.agent, model=self.model_name) as span:
+            response = self.llm.invoke(messages, **kwargs)
+            self._record_usage(metrics, span, getattr(response, "usage_metadata", None))
+        return response
+
+    def stream(self, messages, **kwargs):
+        metrics = get_metrics()
+        with metrics.span("llm.stream", agent=self.agent, model=self.model_name) as span:
+            first_chunk = True
+            usage = None
+            started = time.perf_counter()
+            for chunk in self.llm.stream(messages, **kwargs):
+                if first_chunk:
+                    span["time_to_first_token"] = time.perf_counter() - started
+                    first_chunk = False
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                yield chunk
+            self._record_usage(metrics, span, usage)
+
+    def _record_usage(self, metrics: Metrics, span: dict, usage: Optional[dict]):
+        metrics.incr("llm_calls", agent=self.agent)
+        if usage:
+            span["input_tokens"] = usage.get("input_tokens", 0)
+            span["output_tokens"] = usage.get("output_tokens", 0)
+            metrics.incr("llm_tokens", span["input_tokens"], agent=self.agent, kind="input")
+            metrics.incr("llm_tokens", span["output_tokens"], agent=self.agent, kind="output")
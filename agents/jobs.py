@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+from agents.clients import key_fingerprint
+from agents.instrumentation import get_metrics
+
+DEFAULT_JOBS_PATH = os.path.join(".cache", "jobs.sqlite3")
+
+# Jobs in these states are still in flight and absorb duplicate submissions
+ACTIVE_STATES = ("queued", "running")
+
+_COLUMNS = ("id", "topic", "options", "state", "stage", "message", "progress", "result", "error",
+            "created_at", "updated_at")
+
+
+class JobQueue:
+    def __init__(self, coordinator_factory: Callable[[], Any], path: Optional[str] = DEFAULT_JOBS_PATH,
+                 max_workers: int = 2, progress_interval: float = 0.5, max_jobs: int = 500):
+        """Runs research jobs on a worker pool and records their progress in SQLite.
+
+        A job outlives the Streamlit script run that submitted it: callers keep
+        the job id and poll get() for the stage, partial summary and posts, and
+        finally the result. Submitting a topic that is already queued or
+        running with the same options returns the existing job's id.
+
+        API keys are held in memory only, so jobs that were in flight when the
+        process stopped are marked failed on the next start rather than resumed.
+
+        Args:
+            coordinator_factory: Builds a fresh ResearchCoordinator for each job
+            path: SQLite file for job state, or None to keep it in memory
+            max_workers: Jobs run at once; further submissions wait in the queue
+            progress_interval: Minimum seconds between progress writes while text streams
+            max_jobs: Finished jobs kept before the oldest are deleted
+        """
+        self.coordinator_factory = coordinator_factory
+        self.progress_interval = progress_interval
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._lock = threading.Lock()
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, dedupe_key TEXT, topic TEXT, options TEXT, state TEXT, "
+            "stage TEXT, message TEXT, progress TEXT, result TEXT, error TEXT, "
+            "created_at REAL, updated_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, state)")
+        self._db.execute(
+            "UPDATE jobs SET state = 'failed', error = 'Interrupted by a restart', updated_at = ? "
+            f"WHERE state IN {ACTIVE_STATES}", (time.time(),)
+        )
+        self._db.commit()
+
+    def submit(self, topic: str, openai_api_key: str, serp_api_key: str, generate_images: bool = False,
+               generate_graphs: bool = False, fused: bool = False, enrich: bool = False,
+               tones: Optional[List[str]] = None, post_lengths: Optional[List[str]] = None) -> str:
+        """Queue a research job and return its id, or the id of an identical job already in flight"""
+        options = {"generate_images": generate_images, "generate_graphs": generate_graphs, "fused": fused,
+                   "enrich": enrich, "tones": list(tones or ["professional"]),
+                   "post_lengths": list(post_lengths or ["medium"])}
+        dedupe_key = _dedupe_key(topic, options, openai_api_key)
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT id FROM jobs WHERE dedupe_key = ? AND state IN {ACTIVE_STATES}", (dedupe_key,)
+            ).fetchone()
+            if row is not None:
+                print(f"[JobQueue] Joining in-flight job {row[0]} for: {topic}")
+                get_metrics().incr("jobs_coalesced")
+                return row[0]
+
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, dedupe_key, topic, options, state, stage, message, progress, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', 'queued', 'Waiting for a worker...', ?, ?, ?)",
+                (job_id, dedupe_key, topic, json.dumps(options), json.dumps(_empty_progress()), now, now)
+            )
+            self._prune()
+            self._db.commit()
+
+        get_metrics().incr("jobs_submitted")
+        self._executor.submit(self._run, job_id, topic, options, openai_api_key, serp_api_key)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job, or None if it is unknown.
+
+        Returns:
+            Dictionary with 'id', 'topic', 'options', 'state' ('queued', 'running',
+            'done' or 'failed'), 'stage', 'message', 'progress' (partial 'summary',
+            'posts' and 'current'), 'result' once done, 'error' if failed, and timestamps
+        """
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _to_job(row) if row else None
+
+    def list_jobs(self, limit: int = 20) -> List[dict]:
+        """Most recently submitted jobs first"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_to_job(row) for row in rows]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id: str, topic: str, options: dict, openai_api_key: str, serp_api_key: str):
+        self._update(job_id, state="running", stage="starting", message="Starting...")
+        progress = _empty_progress()
+        last_write = 0.0
+
+        try:
+            coordinator = self.coordinator_factory()
+            coordinator.fused = options["fused"]
+            coordinator.enrich = options.get("enrich", False)
+            coordinator.tones = options.get("tones", ["professional"])
+            coordinator.post_lengths = options.get("post_lengths", ["medium"])
+            events = coordinator.run_stream(
+                topic,
+                openai_api_key=openai_api_key,
+                serp_api_key=serp_api_key,
+                generate_images=options["generate_images"],
+                generate_graphs=options["generate_graphs"]
+            )
+            for event in events:
+                if event["type"] == "status":
+                    self._update(job_id, stage=event.get("stage"), message=event["message"], progress=progress)
+                    last_write = time.monotonic()
+                    continue
+                if event["type"] == "result":
+                    self._update(job_id, state="done", stage="done", message="Done",
+                                 progress=progress, result=serialize_result(event["result"]))
+                    get_metrics().incr("jobs_finished", state="done")
+                    return
+
+                if event["type"] == "summary":
+                    progress["summary"] += event["delta"]
+                elif event["type"] == "posts":
+                    progress["posts"], progress["current"] = event["posts"], event["current"]
+                # Streamed text arrives per token; write it at most every progress_interval
+                if time.monotonic() - last_write >= self.progress_interval:
+                    self._update(job_id, progress=progress)
+                    last_write = time.monotonic()
+
+            raise RuntimeError("Research ended without a result")
+
+        except Exception as e:
+            print(f"[JobQueue] Job {job_id} failed: {e}")
+            self._update(job_id, state="failed", message="Failed", progress=progress,
+                         error=f"{type(e).__name__}: {e}")
+            get_metrics().incr("jobs_finished", state="failed")
+
+    def _update(self, job_id: str, **fields):
+        """Write the given columns; dict values are stored as JSON"""
+        fields = {name: json.dumps(value) if isinstance(value, dict) else value
+                  for name, value in fields.items() if value is not None}
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond max_jobs (caller holds the lock)"""
+        self._db.execute(
+            f"DELETE FROM jobs WHERE state NOT IN {ACTIVE_STATES} AND id NOT IN "
+            "(SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?)", (self.max_jobs,)
+        )
+
+
+def serialize_result(result: dict) -> dict:
+    """Make a coordinator result JSON-serializable; rendered graphs become base64 strings"""
+    return {
+        "summary": result.get("summary", ""),
+        "posts": result.get("posts", []),
+        "post_variants": result.get("post_variants", []),
+        "images": result.get("images", []),
+        "graphs": [base64.b64encode(buf.getvalue()).decode("ascii") for buf in result.get("graphs", [])],
+        "errors": result.get("errors", {}),
+    }
+
+
+def _empty_progress() -> dict:
+    return {"summary": "", "posts": [], "current": ""}
+
+
+def _dedupe_key(topic: str, options: dict, openai_api_key: str) -> str:
+    """Same normalized topic, options and account; the key itself is only hashed"""
+    normalized = " ".join(topic.lower().split())
+    account = key_fingerprint(openai_api_key)
+    payload = json.dumps({"topic": normalized, "options": options, "account": account}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _to_job(row: tuple) -> Dict[str, Any]:
+    job = dict(zip(_COLUMNS, row))
+    for name in ("options", "progress", "result"):
+        if job[name] is not None:
+            job[name] = json.loads(job[name])
+    return job
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+from typing import TYPE_CHECKING, Any, Iterator, List, Optional
+
+from agents.cache import ResultCache
+from agents.clients import ClientRegistry
+from agents.instrumentation import InstrumentedChatModel, get_metrics
+from agents.rate_limit import QuotaManager, RateLimitedChatModel, RateLimiter
+
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage, AIMessageChunk
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(".cache", "llm_cache.sqlite3")
+MAX_SIMILAR_ENTRIES = 32  # Recent sources texts remembered per prompt for near-duplicate lookups
+
+
+def wrapped_chat_model(clients: ClientRegistry, api_key: str, model: str, temperature: float, agent: str,
+                       rate_limiter: Optional[RateLimiter] = None, quota: Optional[QuotaManager] = None,
+                       cache: Optional[ResultCache] = None, similarity: Optional[float] = None):
+    """Chat model from the registry, wrapped the same way for every agent.
+
+    Innermost first: InstrumentedChatModel records every real call,
+    RateLimitedChatModel waits for the explicit limiter or the quota's
+    per-key one, and CachedChatModel sits outside the limiter so cache hits
+    don't wait for a slot.
+    """
+    llm = InstrumentedChatModel(
+        clients.chat_model(api_key, model, temperature, stream_usage=True, include_response_headers=True),
+        agent=agent
+    )
+    rate_limiter = rate_limiter or (quota.limiter("openai", api_key) if quota else None)
+    if rate_limiter:
+        llm = RateLimitedChatModel(llm, rate_limiter)
+    if cache:
+        llm = CachedChatModel(llm, cache, similarity=similarity)
+    return llm
+
+
+class CachedChatModel:
+    def __init__(self, llm, cache: ResultCache, similarity: Optional[float] = None):
+        """Content-addressed cache in front of a chat model's invoke() and stream().
+
+        With a similarity threshold, messages are compared ignoring case,
+        punctuation and whitespace, and a request whose last message (the
+        sources text or summary) is a near-duplicate of a cached one, with
+        everything else equal, is answered from that entry. Near-duplicates
+        are found by MinHash over word shingles (agents/ranking.py).
+
+        Args:
+            llm: The chat model to wrap (e.g. ChatOpenAI)
+            cache: Store for responses; hit/miss counts come from cache.stats()
+            similarity: Estimated Jaccard similarity of the last message at which
+                a cached response is reused, e.g. 0.9; None matches exact requests only
+        """
+        self.llm = llm
+        self.cache = cache
+        self.similarity = similarity
+        self._hasher = None
+        if similarity is not None:
+            from agents.ranking import MinHasher  # numpy is only needed for near-duplicate lookups
+            self._hasher = MinHasher()
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything we don't cache is forwarded to the wrapped model
+        return getattr(self.llm, name)
+
+    def invoke(self, messages: List[Any], **kwargs) -> "AIMessage":
+        """Return the cached response for these messages, calling the LLM only on a miss.
+
+        Extra keyword arguments (e.g. response_format) go to the model and are
+        part of the cache key.
+        """
+        key = self._make_key(messages, kwargs)
+        cached = self._lookup(key, messages, kwargs)
+        if cached is not None:
+            from langchain_core.messages import AIMessage
+            return AIMessage(content=cached["content"])
+
+        response = self.llm.invoke(messages, **kwargs)
+        self._store(key, messages, kwargs, response.content)
+        return response
+
+    def stream(self, messages: List[Any], **kwargs) -> Iterator["AIMessageChunk"]:
+        """Stream the response; a cache hit is replayed as a single chunk"""
+        key = self._make_key(messages, kwargs)
+        cached = self._lookup(key, messages, kwargs)
+        if cached is not None:
+            from langchain_core.messages import AIMessageChunk
+            yield AIMessageChunk(content=cached["content"])
+            return
+
+        parts = []
+        for chunk in self.llm.stream(messages, **kwargs):
+            parts.append(chunk.content)
+            yield chunk
+        # Only cache responses that were streamed to completion
+        self._store(key, messages, kwargs, "".join(parts))
+
+    def _lookup(self, key: str, messages: List[Any], options: dict) -> Optional[dict]:
+        """Exact entry for key, else the closest near-duplicate at or above the threshold"""
+        cached = self.cache.get("llm", key)
+        if cached is not None or self._hasher is None or not messages:
+            return cached
+
+        signature = self._signature(messages[-1])
+        if signature is None:
+            return None
+        from agents.ranking import similarity
+
+        best, best_key = self.similarity, None
+        for entry in self.cache.get("llm_similar", self._frame_key(messages, options)) or []:
+            score = similarity(signature, entry["signature"])
+            if score >= best:
+                best, best_key = score, entry["key"]
+        if best_key is None:
+            return None
+        cached = self.cache.get("llm", best_key)
+        if cached is not None:
+            get_metrics().incr("llm_cache_similar_hits")
+        return cached
+
+    def _store(self, key: str, messages: List[Any], options: dict, content: str):
+        self.cache.set("llm", key, {"content": content})
+        if self._hasher is None or not messages:
+            return
+        signature = self._signature(messages[-1])
+        if signature is None:
+            return
+        # Recent entries for the same prompt; concurrent stores may drop one, which only costs a lookup
+        frame_key = self._frame_key(messages, options)
+        entries = [entry for entry in self.cache.get("llm_similar", frame_key) or [] if entry["key"] != key]
+        entries.append({"key": key, "signature": signature.tolist()})
+        self.cache.set("llm_similar", frame_key, entries[-MAX_SIMILAR_ENTRIES:])
+
+    def _signature(self, message: Any):
+        from agents.ranking import tokenize
+        return self._hasher.signature(tokenize(self._normalize(message)[1]))
+
+    def _frame_key(self, messages: List[Any], options: Optional[dict] = None) -> str:
+        """Key of everything but the last message, which near-duplicate lookups compare by similarity"""
+        return "llm_similar:" + self._make_key(messages[:-1], options).split(":", 1)[1]
+
+    def _make_key(self, messages: List[Any], options: Optional[dict] = None) -> str:
+        """Hash of model, temperature, call options and the normalized message list"""
+        payload = {
+            "model": getattr(self.llm, "model_name", None),
+            "temperature": getattr(self.llm, "temperature", None),
+            "messages": [self._normalize(message) for message in messages],
+        }
+        if options:
+            # Only added when present, so plain calls keep their existing keys
+            payload["options"] = options
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"llm:{digest}"
+
+    def _normalize(self, message: Any) -> List[str]:
+        """Reduce LangChain messages and role/content dicts to (role, content)"""
+        if isinstance(message, dict):
+            role, content = message.get("role", ""), message.get("content", "")
+        else:
+            role, content = message.type, message.content
+
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True)
+        if self.similarity is not None:
+            content = " ".join(re.sub(r"[^\w\s]", " ", content.lower()).split())
+        return [role, content]
@@ -1,32 +1,176 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import xml.etree.ElementTree as ET
+from typing import Iterator, List, Optional
+from agents.cache import ResultCache
+from agents.rate_limit import RateLimiter
+from agents.http_client import HttpClient, get_default_client
+from agents.instrumentation import get_metrics
+
+ARXIV_API_URL = "http://export.arxiv.org/api/query"
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+# arXiv's API terms ask for no more than one request every three seconds
+ARXIV_CALLS_PER_MINUTE = 20
 
 class PaperResearchAgent:
-    def __init__(self, max_results=5):
+    def __init__(self, max_results=5, cache: Optional[ResultCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, http: Optional[HttpClient] = None,
+                 page_size: int = 100, page_concurrency: int = 3):
         self.max_results = max_results
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.http = http or get_default_client()
+        self.page_size = page_size  # Results per arXiv request
+        self.page_concurrency = page_concurrency  # Pages in flight at once (the limiter still spaces them)
+
+    def run(self, query: str, since: Optional[datetime] = None) -> list:
+        """Fetch academic papers from arXiv.
+
+        Results beyond page_size are requested as several pages in parallel,
+        each parsed incrementally as it downloads. With since (a UTC datetime),
+        only papers submitted after it are returned, newest first.
+        """
+        cache_key = None
+        if self.cache:
+            window = {"since": since.isoformat()} if since else {}
+            cache_key = self.cache.make_key("papers", query, max_results=self.max_results, **window)
+            cached = self.cache.get("papers", cache_key)
+            if cached is not None:
+                print(f"[PaperResearchAgent] Cache hit for: {query}")
+                return cached
 
-    def run(self, query: str) -> list:
-        """Fetch academic papers from arXiv."""
         print(f"[PaperResearchAgent] Searching arXiv for: {query}")
-        url = f"http://export.arxiv.org/api/query?search_query=all:{query}&start=0&max_results={self.max_results}"
 
         try:
-            response = requests.get(url)
-            root = ET.fromstring(response.content)
+            starts = range(0, self.max_results, self.page_size)
+            if len(starts) == 1:
+                pages = [self._fetch_page(query, 0, self.max_results, since)]
+            else:
+                with ThreadPoolExecutor(max_workers=self.page_concurrency) as executor:
+                    pages = list(executor.map(
+                        lambda start: self._fetch_page(query, start, min(self.page_size, self.max_results - start),
+                                                       since),
+                        starts
+                    ))
 
-            ns = {"arxiv": "http://www.w3.org/2005/Atom"}
             papers = []
+            seen = set()
+            for page in pages:
+                for paper in page:
+                    if paper["link"] not in seen:
+                        seen.add(paper["link"])
+                        papers.append(paper)
+            papers = papers[:self.max_results]
 
-            for entry in root.findall("arxiv:entry", ns):
-                papers.append({
-                    "type": "paper",
-                    "title": entry.find("arxiv:title", ns).text.strip(),
-                    "summary": entry.find("arxiv:summary", ns).text.strip(),
-                    "link": entry.find("arxiv:id", ns).text.strip()
-                })
-
+            if self.cache and papers:
+                self.cache.set("papers", cache_key, papers)
             return papers
 
         except Exception as e:
             print(f"[PaperResearchAgent] Error: {e}")
             return []
+
+    def _fetch_page(self, query: str, start: int, size: int, since: Optional[datetime] = None) -> List[dict]:
+        """Helper to fetch one page; a failed page is logged and skipped so the others survive"""
+        try:
+            return list(self.iter_page(query, start, size, since))
+        except Exception as e:
+            print(f"[PaperResearchAgent] Error fetching results {start}-{start + size}: {e}")
+            return []
+
+    def iter_page(self, query: str, start: int = 0, size: Optional[int] = None,
+                  since: Optional[datetime] = None) -> Iterator[dict]:
+        """Yield papers from one page of arXiv results as the response streams in.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+            xml.etree.ElementTree.ParseError: If the feed is malformed
+        """
+        params = {
+            "search_query": f"all:{query}",
+            "start": start,
+            "max_results": size or self.max_results,
+        }
+        if since:
+            until = datetime.now(timezone.utc)
+            params["search_query"] += f" AND submittedDate:[{since:%Y%m%d%H%M} TO {until:%Y%m%d%H%M}]"
+            params["sortBy"] = "submittedDate"
+            params["sortOrder"] = "descending"
+        with get_metrics().span("papers.search", start=start) as span:
+            # Retries wait for the limiter too, so arXiv never sees requests closer than it allows
+            response = self.http.get(ARXIV_API_URL, params=params, stream=True, rate_limiter=self.rate_limiter)
+            try:
+                response.raise_for_status()
+                count = 0
+                for paper in parse_feed(response.iter_content(chunk_size=16384)):
+                    count += 1
+                    yield paper
+                span["results"] = count
+            finally:
+                response.close()
+
+
+def parse_feed(chunks) -> Iterator[dict]:
+    """Incrementally parse an arXiv Atom feed from an iterable of byte chunks.
+
+    Each entry is yielded as soon as its closing tag arrives and is then
+    detached from the tree, so memory stays flat however many results the
+    feed holds. Entries missing optional fields are kept with defaults;
+    entries without an id (or arXiv's error entries) are skipped.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == f"{ATOM}entry":
+                paper = _parse_entry(elem)
+                if root is not None:
+                    root.remove(elem)
+                if paper:
+                    yield paper
+
+    parser.close()
+
+
+def _parse_entry(entry: ET.Element) -> Optional[dict]:
+    link = _text(entry, f"{ATOM}id")
+    if not link:
+        return None
+    if "/api/errors" in link:
+        print(f"[PaperResearchAgent] arXiv error: {_text(entry, f'{ATOM}summary')}")
+        return None
+
+    pdf_link = ""
+    for link_elem in entry.findall(f"{ATOM}link"):
+        if link_elem.get("title") == "pdf":
+            pdf_link = link_elem.get("href", "")
+    primary = entry.find(f"{ARXIV}primary_category")
+    authors = (_text(author, f"{ATOM}name") for author in entry.findall(f"{ATOM}author"))
+
+    return {
+        "type": "paper",
+        "title": _text(entry, f"{ATOM}title") or "Untitled",
+        "summary": _text(entry, f"{ATOM}summary"),
+        "link": link,
+        "pdf_link": pdf_link,
+        "authors": [name for name in authors if name],
+        "categories": [c.get("term") for c in entry.findall(f"{ATOM}category") if c.get("term")],
+        "primary_category": primary.get("term", "") if primary is not None else "",
+        "published": _text(entry, f"{ATOM}published"),
+        "updated": _text(entry, f"{ATOM}updated"),
+    }
+
+
+def _text(elem: ET.Element, tag: str) -> str:
+    """Whitespace-normalized text of a child element, or '' if it is missing"""
+    child = elem.find(tag)
+    if child is None or child.text is None:
+        return ""
+    return " ".join(child.text.split())
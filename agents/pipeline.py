@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import time
+from typing import Any, Callable, Dict, List, Optional
+from agents.instrumentation import get_metrics
+
+
+class PipelineError(RuntimeError):
+    """Raised when a required stage fails or times out."""
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable[..., Any], deps: Optional[List[str]] = None,
+                 timeout: Optional[float] = None, required: bool = False, default: Any = None):
+        """A single unit of work in the pipeline.
+
+        Args:
+            name: Unique stage name, also the key of its result
+            func: Callable receiving the results of its dependencies as keyword arguments
+            deps: Names of the stages that must finish before this one starts
+            timeout: Seconds the stage may run before it is given up on
+            required: If True, a failure or timeout aborts the whole run
+            default: Result used in place of a failed optional stage
+        """
+        self.name = name
+        self.func = func
+        self.deps = deps or []
+        self.timeout = timeout
+        self.required = required
+        self.default = default
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], max_workers: int = 4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+
+    def run(self) -> tuple[Dict[str, Any], Dict[str, str]]:
+        """Run every stage as soon as its dependencies are done.
+
+        Independent stages run concurrently, so the wall-clock time is roughly
+        the longest dependency chain rather than the sum of all stages.
+
+        Returns:
+            Tuple of (results by stage name, error messages by stage name)
+
+        Raises:
+            PipelineError: If a required stage fails or times out
+        """
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        pending = dict(self.stages)
+        running = {}  # future -> (stage, deadline)
+
+        # Named threads make stages easy to spot in py-spy and other samplers
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline")
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.deps):
+                        kwargs = {dep: results[dep] for dep in stage.deps}
+                        deadline = time.monotonic() + stage.timeout if stage.timeout else None
+                        running[executor.submit(self._run_stage, stage, kwargs)] = (stage, deadline)
+                        del pending[name]
+
+                if not running:
+                    raise PipelineError(f"Unresolvable dependencies for stages: {list(pending)}")
+
+                deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, _ = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as e:
+                        self._handle_failure(stage, f"{type(e).__name__}: {e}", results, errors)
+
+                now = time.monotonic()
+                for future, (stage, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        running.pop(future)
+                        future.cancel()
+                        self._handle_failure(stage, f"timed out after {stage.timeout}s", results, errors)
+        finally:
+            # Timed-out stages may still be running; don't block on them
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results, errors
+
+    def _run_stage(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        with get_metrics().span(f"stage.{stage.name}"):
+            return stage.func(**kwargs)
+
+    def _handle_failure(self, stage: Stage, message: str, results: Dict[str, Any], errors: Dict[str, str]):
+        """Apply the partial-result policy to a failed stage"""
+        print(f"[Pipeline] Stage '{stage.name}' failed: {message}")
+        if stage.required:
+            raise PipelineError(f"Required stage '{stage.name}' failed: {message}")
+        errors[stage.name] = message
+        get_metrics().incr("stage_failures", stage=stage.name)
+        results[stage.name] = stage.default
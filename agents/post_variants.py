@@ -0,0 +1,130 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from agents.ranking import tokenize
+
+TONES = ("professional", "casual", "enthusiastic")
+
+# Prompt wording and the character range a post of each length should land in
+POST_LENGTHS = {
+    "short": {"prompt": "1-2 short paragraphs", "chars": (300, 700)},
+    "medium": {"prompt": "3-5 paragraphs", "chars": (700, 1500)},
+    "long": {"prompt": "5-7 paragraphs", "chars": (1300, 2600)},
+}
+
+LINKEDIN_MAX_CHARS = 3000  # Hard limit for a post
+FOLD_CHARS = 210  # Roughly what LinkedIn shows before "...see more"
+HASHTAG_RANGE = (3, 5)
+
+# Relative weight of each check in a post's score
+SCORE_WEIGHTS = {
+    "length": 0.3,
+    "hashtags": 0.2,
+    "readability": 0.3,
+    "hook": 0.2,
+}
+
+_HASHTAG = re.compile(r"(?<!\w)#\w+")
+_SENTENCE_END = re.compile(r"[.!?]+(?:\s|$)")
+_VOWEL_GROUPS = re.compile(r"[aeiouy]+")
+
+
+class PostScorer:
+    def __init__(self, duplicate_threshold: float = 0.5, shingle_size: int = 3,
+                 weights: Optional[Dict[str, float]] = None):
+        """Score LinkedIn post drafts locally and rank them, dropping near-duplicates.
+
+        Every check gives a value between 0 and 1: length against the
+        target for the draft's length, hashtag count, Flesch reading ease,
+        and whether the opening line fits above LinkedIn's "see more" fold.
+        The score is their weighted sum. Posts over LinkedIn's character
+        limit score 0.
+
+        Args:
+            duplicate_threshold: Jaccard similarity of word shingles at which a
+                draft counts as a near-duplicate of a better-scored one
+            shingle_size: Words per shingle for duplicate detection
+            weights: Weight per check, merged over SCORE_WEIGHTS
+        """
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.weights = {**SCORE_WEIGHTS, **(weights or {})}
+
+    def rank(self, drafts: List[dict]) -> List[dict]:
+        """Drafts ('text', 'tone', 'length') with 'score' and 'checks' added, best first.
+
+        A draft that is a near-duplicate of a better-scored one is dropped,
+        whichever tone or length it came from.
+        """
+        scored = sorted((self.score(draft) for draft in drafts), key=lambda draft: -draft["score"])
+
+        ranked = []
+        kept_shingles = []
+        for draft in scored:
+            shingles = self._shingles(draft["text"])
+            if any(_jaccard(shingles, kept) >= self.duplicate_threshold for kept in kept_shingles):
+                continue
+            kept_shingles.append(shingles)
+            ranked.append(draft)
+        return ranked
+
+    def score(self, draft: dict) -> dict:
+        """Copy of the draft with per-check values under 'checks' and their weighted 'score'"""
+        text = draft["text"]
+        low, high = POST_LENGTHS.get(draft.get("length"), POST_LENGTHS["medium"])["chars"]
+        hashtags = len(_HASHTAG.findall(text))
+        first_line = text.strip().split("\n", 1)[0]
+
+        checks = {
+            "length": _within(len(text), low, high),
+            "hashtags": _within(hashtags, *HASHTAG_RANGE, margin=3),
+            "readability": min(1.0, max(0.0, (reading_ease(text) - 30) / 30)),
+            "hook": 1.0 if len(first_line) <= FOLD_CHARS else FOLD_CHARS / len(first_line),
+        }
+        total = sum(self.weights[name] * value for name, value in checks.items())
+        total /= sum(self.weights[name] for name in checks) or 1.0
+        if len(text) > LINKEDIN_MAX_CHARS:
+            total = 0.0
+        return {**draft, "score": round(total, 3), "checks": {name: round(v, 3) for name, v in checks.items()}}
+
+    def _shingles(self, text: str) -> set:
+        words = tokenize(_HASHTAG.sub(" ", text))
+        size = min(self.shingle_size, len(words))
+        return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)} if words else set()
+
+
+def variant_grid(tones: List[str], lengths: List[str]) -> List[Tuple[str, str]]:
+    """Every (tone, length) pair to generate, in a stable order"""
+    return [(tone, length) for length in lengths for tone in tones]
+
+
+def reading_ease(text: str) -> float:
+    """Flesch reading ease; 60-70 is plain English, below 30 reads like an academic paper"""
+    words = re.findall(r"[A-Za-z]+", _HASHTAG.sub(" ", text))
+    if not words:
+        return 0.0
+    sentences = max(1, len(_SENTENCE_END.findall(text)))
+    syllables = sum(_syllables(word) for word in words)
+    return 206.835 - 1.015 * len(words) / sentences - 84.6 * syllables / len(words)
+
+
+def _syllables(word: str) -> int:
+    word = word.lower()
+    count = len(_VOWEL_GROUPS.findall(word))
+    if word.endswith("e") and not word.endswith(("le", "ee")) and count > 1:
+        count -= 1  # Silent e
+    return max(1, count)
+
+
+def _within(value: float, low: float, high: float, margin: Optional[float] = None) -> float:
+    """1 inside [low, high], falling off linearly to 0 at margin (default half the range) outside it"""
+    if low <= value <= high:
+        return 1.0
+    margin = margin or max(1.0, (high - low) / 2)
+    distance = low - value if value < low else value - high
+    return max(0.0, 1.0 - distance / margin)
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,157 @@
+import re
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import zlib
+
+import numpy as np
+
+# Query parameters that only track the click and never change the page
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"}
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "with",
+}
+_ARXIV_ID = re.compile(r"^/(?:abs|pdf)/(.+?)(?:v\d+)?(?:\.pdf)?$")
+_PRIME = (1 << 31) - 1  # Keeps a * hash + b inside uint64 for 32-bit hashes
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so that trivially different links to the same page compare equal.
+
+    Lowercases the host, drops 'www.', fragments, tracking parameters and
+    trailing slashes, and maps every arXiv abs/pdf/version link to one form.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+
+    if host in ("arxiv.org", "export.arxiv.org"):
+        match = _ARXIV_ID.match(path)
+        if match:
+            return f"arxiv.org/abs/{match.group(1)}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in TRACKING_PARAMS
+    )
+    # Scheme is dropped on purpose: http and https serve the same article
+    return urlunsplit(("", host, path, urlencode(query), "")).lstrip("/")
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        """MinHash signatures of word shingles; the share of equal positions in two
+        signatures estimates the Jaccard similarity of the texts.
+
+        Args:
+            num_perm: Number of MinHash permutations
+            shingle_size: Words per shingle
+            seed: Seed for the permutations; signatures only compare under the same seed
+        """
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._perm_a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._perm_b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, words: List[str]) -> Optional[np.ndarray]:
+        """MinHash signature of the words' shingles, or None if there are no words"""
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        return ((np.outer(hashes, self._perm_a) + self._perm_b) % _PRIME).min(axis=0)
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures (arrays or lists)"""
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+class SourceRanker:
+    def __init__(self, top_k: int = 8, duplicate_threshold: float = 0.7, num_perm: int = 64,
+                 shingle_size: int = 3, k1: float = 1.5, b: float = 0.75, seed: int = 1):
+        """Rank research sources by relevance to the topic and drop redundant ones.
+
+        Args:
+            top_k: Number of sources passed downstream
+            duplicate_threshold: Estimated Jaccard similarity at which two sources
+                count as near-duplicates
+            num_perm: Number of MinHash permutations
+            shingle_size: Words per shingle for near-duplicate detection
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            seed: Seed for the MinHash permutations
+        """
+        self.top_k = top_k
+        self.duplicate_threshold = duplicate_threshold
+        self.k1 = k1
+        self.b = b
+        self._hasher = MinHasher(num_perm, shingle_size, seed)
+
+    def rank(self, topic: str, sources: List[dict]) -> List[dict]:
+        """Return the top_k most relevant sources with duplicates removed.
+
+        Exact duplicates (same canonical URL) are dropped first, then sources are
+        ordered by BM25 score against the topic, and any source that is a
+        near-duplicate of a better-ranked one is skipped.
+        """
+        unique = []
+        seen_urls = set()
+        for source in sources:
+            url = canonicalize_url(source.get("link", ""))
+            if url and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            unique.append(source)
+
+        if not unique:
+            return []
+
+        documents = [tokenize(f"{s.get('title', '')} {s.get('summary', '')}") for s in unique]
+        scores = self.bm25_scores(tokenize(topic), documents)
+
+        ranked = []
+        kept_signatures = []
+        for index in np.argsort(-scores, kind="stable"):
+            signature = self._hasher.signature(documents[index])
+            if signature is not None and any(
+                similarity(signature, kept) >= self.duplicate_threshold for kept in kept_signatures
+            ):
+                continue
+            if signature is not None:
+                kept_signatures.append(signature)
+            ranked.append(unique[index])
+            if len(ranked) == self.top_k:
+                break
+
+        return ranked
+
+    def bm25_scores(self, query: List[str], documents: List[List[str]]) -> np.ndarray:
+        """BM25 score of every document against the query terms"""
+        terms = sorted(set(query))
+        if not terms:
+            return np.zeros(len(documents))
+
+        column = {term: i for i, term in enumerate(terms)}
+        tf = np.zeros((len(documents), len(terms)))
+        for row, words in enumerate(documents):
+            for word in words:
+                if word in column:
+                    tf[row, column[word]] += 1
+
+        doc_len = np.array([len(words) for words in documents], dtype=float)
+        avg_len = doc_len.mean() or 1.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log((len(documents) - df + 0.5) / (df + 0.5) + 1.0)
+
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+        return (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
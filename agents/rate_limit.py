@@ -0,0 +1,383 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+import functools
+import re
+import threading
+import time
+from typing import Dict, List, Mapping, Optional
+from agents.clients import key_fingerprint
+from agents.instrumentation import get_metrics
+
+# Quotas per provider and API key. OpenAI's real limits depend on the account
+# tier; when its x-ratelimit-* headers report less, the limiter adopts that.
+DEFAULT_QUOTAS = {
+    "openai": {"calls_per_minute": 500, "tokens_per_minute": 90000},
+    "openai_images": {"calls_per_minute": 5},
+    "serpapi": {"calls_per_minute": 30},
+}
+
+# List prices in USD for the cost ledger, by model or provider. Estimates only:
+# check the provider's pricing page before relying on them.
+PRICES = {
+    "gpt-4": {"input": 30.0 / 1e6, "output": 60.0 / 1e6},
+    "gpt-4o": {"input": 2.5 / 1e6, "output": 10.0 / 1e6},
+    "gpt-4o-mini": {"input": 0.15 / 1e6, "output": 0.6 / 1e6},
+    "dall-e-3": {"image": 0.04},
+    "serpapi": {"request": 0.015},
+}
+
+# After a 429 the allowed rate is halved, down to this fraction of the quota,
+# and grows back by RECOVERY_STEP with each successful call
+MIN_RATE_SCALE = 0.1
+RECOVERY_STEP = 0.05
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class RateLimiter:
+    def __init__(self, calls_per_minute: float, tokens_per_minute: Optional[float] = None,
+                 burst: int = 1, name: str = "default"):
+        """Fair, adaptive token-bucket limiter for one provider account.
+
+        Requests and (optionally) tokens each refill continuously at their
+        per-minute rate. Callers wait in arrival order, so a burst of threads
+        is served one by one instead of racing or failing. The rate is halved
+        when the provider answers 429 and recovers gradually on success, and
+        Retry-After / x-ratelimit-* headers pause the limiter until the
+        provider's window resets.
+
+        Args:
+            calls_per_minute: Maximum sustained call rate
+            tokens_per_minute: Token quota (e.g. OpenAI TPM), or None to only count calls
+            burst: Calls allowed back to back before spacing applies; 1 spaces every call evenly
+            name: Label for metrics and the quota ledger
+        """
+        self.calls_per_minute = calls_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst = burst
+        self.name = name
+        self.on_usage = None  # Set by QuotaManager to feed its ledger
+
+        self._scale = 1.0
+        self._calls = float(burst)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+
+    @property
+    def interval(self) -> float:
+        """Seconds between calls at the current rate"""
+        return 60.0 / (self.calls_per_minute * self._scale)
+
+    def acquire(self, tokens: int = 0):
+        """Block until the caller may make its next call, reserving an estimate of its tokens"""
+        ticket = object()
+        waited = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    delay = None  # Not first in line: wait to be notified
+                    if self._queue[0] is ticket:
+                        delay = self._delay(tokens)
+                        if delay <= 0:
+                            self._calls -= 1
+                            if self.tokens_per_minute:
+                                self._tokens -= min(tokens, self.tokens_per_minute)
+                            break
+                    self._cond.wait(delay)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - waited
+        if waited > 0.01:
+            get_metrics().incr("rate_limit_wait_ms", int(waited * 1000), limiter=self.name)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once a call's real usage is known"""
+        if not self.tokens_per_minute:
+            return
+        with self._cond:
+            self._refill()
+            self._tokens = min(self.tokens_per_minute, self._tokens + estimated_tokens - actual_tokens)
+            self._cond.notify_all()
+
+    def on_success(self):
+        """Additive recovery after a rate-limit back-off"""
+        if self._scale < 1.0:
+            with self._cond:
+                self._refill()
+                self._scale = min(1.0, self._scale + RECOVERY_STEP)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Back off after a 429: halve the rate and pause until retry_after (or one interval)"""
+        with self._cond:
+            self._refill()
+            self._scale = max(MIN_RATE_SCALE, self._scale / 2)
+            self._calls = min(self._calls, 0.0)
+            self._pause(retry_after if retry_after is not None else self.interval)
+        get_metrics().incr("rate_limited", limiter=self.name)
+        print(f"[RateLimiter] {self.name} rate limited; slowing to {self._scale:.0%} of quota")
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Adapt to Retry-After and OpenAI-style x-ratelimit-* response headers"""
+        if not headers:
+            return
+        headers = {name.lower(): value for name, value in headers.items()}
+        retry_after = parse_retry_after(headers.get("retry-after-ms"), milliseconds=True)
+        if retry_after is None:
+            retry_after = parse_retry_after(headers.get("retry-after"))
+
+        with self._cond:
+            self._refill()
+            # The configured quota is a ceiling; a smaller account limit wins
+            limit = _number(headers.get("x-ratelimit-limit-requests"))
+            if limit:
+                self.calls_per_minute = min(self.calls_per_minute, limit)
+            limit = _number(headers.get("x-ratelimit-limit-tokens"))
+            if limit and self.tokens_per_minute:
+                self.tokens_per_minute = min(self.tokens_per_minute, limit)
+
+            remaining = _number(headers.get("x-ratelimit-remaining-requests"))
+            if remaining is not None:
+                self._calls = min(self._calls, remaining)
+                if remaining < 1:
+                    self._pause(parse_duration(headers.get("x-ratelimit-reset-requests")))
+            remaining = _number(headers.get("x-ratelimit-remaining-tokens"))
+            if remaining is not None and self.tokens_per_minute:
+                self._tokens = min(self._tokens, remaining)
+            if retry_after is not None:
+                self._pause(retry_after)
+            self._cond.notify_all()
+
+    def record(self, model: Optional[str] = None, input_tokens: int = 0, output_tokens: int = 0,
+               images: int = 0):
+        """Report a completed call to the quota ledger, if this limiter belongs to one"""
+        if self.on_usage:
+            self.on_usage(model=model, input_tokens=input_tokens, output_tokens=output_tokens, images=images)
+
+    def _delay(self, tokens: int) -> float:
+        """Seconds until a call needing tokens fits in both buckets (caller holds the lock)"""
+        self._refill()
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        delay = 0.0
+        if self._calls < 1:
+            delay = (1 - self._calls) * self.interval
+        if self.tokens_per_minute:
+            needed = min(tokens, self.tokens_per_minute) - self._tokens
+            if needed > 0:
+                delay = max(delay, needed * 60.0 / (self.tokens_per_minute * self._scale))
+        return delay
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._calls = min(self.burst, self._calls + elapsed / self.interval)
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute * self._scale / 60.0
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * rate)
+
+    def _pause(self, seconds: Optional[float]):
+        if seconds:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class QuotaManager:
+    def __init__(self, quotas: Optional[Dict[str, dict]] = None, prices: Optional[Dict[str, dict]] = None):
+        """Shared limiters per provider and API key, plus a running usage and cost ledger.
+
+        Every agent that asks for the same provider and key gets the same
+        RateLimiter, so concurrent runs (batch topics, background jobs) share
+        one budget. Keys are only held as a hash.
+
+        Args:
+            quotas: RateLimiter arguments by provider, merged over DEFAULT_QUOTAS
+            prices: USD prices by model or provider, merged over PRICES
+        """
+        self.quotas = {provider: dict(quota) for provider, quota in DEFAULT_QUOTAS.items()}
+        for provider, quota in (quotas or {}).items():
+            self.quotas.setdefault(provider, {}).update(quota)
+        self.prices = {**PRICES, **(prices or {})}
+        self._limiters: Dict[tuple, RateLimiter] = {}
+        self._ledger: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str, api_key: str) -> RateLimiter:
+        """The shared limiter for this provider account, created on first use"""
+        key = (provider, key_fingerprint(api_key))
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(name=f"{provider}:{key[1][:8]}", **self.quotas[provider])
+                limiter.on_usage = functools.partial(self._record, key)
+                self._limiters[key] = limiter
+            return limiter
+
+    def ledger(self) -> List[dict]:
+        """Usage and estimated cost so far, one entry per provider account"""
+        with self._lock:
+            entries = [{"provider": provider, "account": account[:8], **dict(usage)}
+                       for (provider, account), usage in self._ledger.items()]
+        for entry in entries:
+            entry["cost_usd"] = round(entry["cost_usd"], 4)
+        return entries
+
+    def total_cost(self) -> float:
+        return round(sum(entry["cost_usd"] for entry in self.ledger()), 4)
+
+    def _record(self, key: tuple, model: Optional[str] = None, input_tokens: int = 0,
+                output_tokens: int = 0, images: int = 0):
+        provider = key[0]
+        price = self.prices.get(model or "") or self.prices.get(provider) or {}
+        cost = (price.get("request", 0.0) + input_tokens * price.get("input", 0.0)
+                + output_tokens * price.get("output", 0.0) + images * price.get("image", 0.0))
+        with self._lock:
+            usage = self._ledger.setdefault(key, {
+                "requests": 0, "input_tokens": 0, "output_tokens": 0, "images": 0, "cost_usd": 0.0
+            })
+            usage["requests"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["images"] += images
+            usage["cost_usd"] += cost
+        metrics = get_metrics()
+        metrics.incr("quota_requests", provider=provider)
+        if input_tokens or output_tokens:
+            metrics.incr("quota_tokens", input_tokens + output_tokens, provider=provider)
+
+
+class RateLimitedChatModel:
+    def __init__(self, llm, rate_limiter: RateLimiter, max_retries: int = 3):
+        """Wrap a chat model so every call waits for the rate limiter first.
+
+        Token use is estimated up front and settled from the response's usage
+        metadata; rate-limit headers feed back into the limiter. A 429 puts the
+        call back in the limiter's queue (up to max_retries times) instead of
+        failing the run.
+        """
+        self.llm = llm
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def invoke(self, messages, **kwargs):
+        estimate = _estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(estimate)
+            try:
+                response = self.llm.invoke(messages, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.rate_limiter.on_rate_limited(retry_after_from_error(e))
+                continue
+            self._settle(estimate, response)
+            return response
+
+    def stream(self, messages, **kwargs):
+        estimate = _estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(estimate)
+            started = False
+            last = None
+            try:
+                for chunk in self.llm.stream(messages, **kwargs):
+                    started = True
+                    last = chunk if last is None else last + chunk
+                    yield chunk
+            except Exception as e:
+                # Chunks already handed to the caller can't be taken back
+                if started or not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.rate_limiter.on_rate_limited(retry_after_from_error(e))
+                continue
+            self._settle(estimate, last)
+            return
+
+    def _settle(self, estimate: int, response):
+        limiter = self.rate_limiter
+        limiter.on_success()
+        metadata = getattr(response, "response_metadata", None) or {}
+        limiter.update_from_headers(metadata.get("headers"))
+        usage = getattr(response, "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        if usage:
+            limiter.settle(estimate, input_tokens + output_tokens)
+        limiter.record(model=metadata.get("model_name") or getattr(self.llm, "model_name", None),
+                       input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+_default_quota: Optional[QuotaManager] = None
+_default_lock = threading.Lock()
+
+
+def get_default_quota() -> QuotaManager:
+    """Process-wide quota manager shared by every coordinator, created on first use"""
+    global _default_quota
+    with _default_lock:
+        if _default_quota is None:
+            _default_quota = QuotaManager()
+        return _default_quota
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for a provider's 429, e.g. openai.RateLimitError"""
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from the failed response's headers"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = parse_retry_after(headers.get("retry-after-ms"), milliseconds=True)
+    return retry_after if retry_after is not None else parse_retry_after(headers.get("retry-after"))
+
+
+def parse_retry_after(value: Optional[str], milliseconds: bool = False) -> Optional[float]:
+    """Seconds from a Retry-After header in either its delta-seconds or HTTP-date form"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        return max(0.0, seconds / 1000 if milliseconds else seconds)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from OpenAI's reset durations such as '1s', '20ms' or '6m0s'"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return _number(value)
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _estimate_tokens(messages) -> int:
+    """Rough prompt size plus headroom for the answer; settled once usage is known"""
+    if isinstance(messages, str):
+        text = messages
+    else:
+        text = " ".join(str(message.get("content", "") if isinstance(message, dict)
+                            else getattr(message, "content", message)) for message in messages)
+    return len(text) // 4 + 500
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
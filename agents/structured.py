@@ -0,0 +1,168 @@
+import json
+import re
+from typing import Any, List, Optional
+from agents.chart_renderer import CHART_TYPES, validate_spec
+
+# Model name prefixes that accept response_format={"type": "json_schema"}; other
+# models get the schema in the prompt and rely on parse_json's repair
+JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o3", "o4")
+
+BUNDLE_SCHEMA_NAME = "research_bundle"
+
+
+def bundle_schema(num_posts: int, max_charts: int) -> dict:
+    """JSON schema for one fused answer: a summary, posts and (optionally) chart specs.
+
+    Written for OpenAI's strict mode: every property is required and no
+    extra keys are allowed. Item counts are asked for in the prompt and
+    enforced by validate_bundle, since strict mode ignores minItems/maxItems.
+    """
+    properties = {
+        "summary": {"type": "string", "description": "Clear, concise explanation for a general audience"},
+        "posts": {
+            "type": "array",
+            "description": f"Exactly {num_posts} standalone LinkedIn posts",
+            "items": {"type": "string"},
+        },
+    }
+    if max_charts:
+        properties["charts"] = {
+            "type": "array",
+            "description": f"1 to {max_charts} charts of figures from the research",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "x_label": {"type": "string"},
+                    "y_label": {"type": "string"},
+                    "x_data": {"type": "array", "items": {"anyOf": [{"type": "number"}, {"type": "string"}]}},
+                    "y_data": {"type": "array", "items": {"type": "number"}},
+                    "type": {"type": "string", "enum": list(CHART_TYPES)},
+                },
+                "required": ["title", "x_label", "y_label", "x_data", "y_data", "type"],
+                "additionalProperties": False,
+            },
+        }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def response_format_for(model: str, schema: dict) -> Optional[dict]:
+    """The response_format that enforces schema on this model, or None if it has no structured output"""
+    if not model.startswith(JSON_SCHEMA_MODELS):
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": BUNDLE_SCHEMA_NAME, "schema": schema, "strict": True},
+    }
+
+
+def parse_json(text: str) -> Any:
+    """Parse a model's JSON answer, repairing the usual defects if it doesn't load as-is.
+
+    Raises:
+        ValueError: If the text can't be parsed even after repair
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    repaired = repair_json(text)
+    try:
+        return json.loads(repaired)
+    except ValueError as e:
+        raise ValueError(f"Response is not valid JSON: {e}") from e
+
+
+def repair_json(text: str) -> str:
+    """Best-effort fix for JSON wrapped in prose or fences, with trailing commas, or cut off.
+
+    Keeps the first top-level object or array, drops trailing commas, and
+    closes any string, array or object left open by a truncated response.
+    """
+    fenced = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    text = text[start:]
+
+    closers: List[str] = []
+    out: List[str] = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            if closers:
+                closers.pop()
+            if not closers:
+                out.append(char)
+                break  # Anything after the top-level value is prose
+        out.append(char)
+
+    if in_string:
+        out.append('"')
+    else:
+        _drop_trailing_comma(out)
+    out.extend(reversed(closers))
+    return "".join(out)
+
+
+def _drop_trailing_comma(out: List[str]):
+    """Remove a comma (and the whitespace after it) at the end of out; commas in strings never get here"""
+    i = len(out)
+    while i and out[i - 1].isspace():
+        i -= 1
+    if i and out[i - 1] == ",":
+        del out[i - 1:]
+
+
+def validate_bundle(data: Any, num_posts: int, max_charts: int) -> dict:
+    """Check a fused answer against the schema and normalize it.
+
+    Extra posts are dropped. Invalid charts are skipped, the same way
+    GraphAgent treats them.
+
+    Raises:
+        ValueError: If the summary or posts are missing or malformed
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object with 'summary' and 'posts'")
+
+    summary = data.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("'summary' must be a non-empty string")
+
+    posts = data.get("posts")
+    if not isinstance(posts, list) or not all(isinstance(post, str) for post in posts):
+        raise ValueError("'posts' must be a list of strings")
+    posts = [post.strip() for post in posts if post.strip()][:num_posts]
+    if not posts:
+        raise ValueError("'posts' is empty")
+
+    charts = []
+    raw_charts = data.get("charts") or []
+    if max_charts and isinstance(raw_charts, list):
+        for raw in raw_charts[:max_charts]:
+            try:
+                charts.append(validate_spec(raw))
+            except ValueError as e:
+                print(f"[SummaryAgent] Skipping invalid chart: {e}")
+
+    return {"summary": summary.strip(), "posts": posts, "charts": charts}
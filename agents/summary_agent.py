@@ -1,34 +1,190 @@
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import json
+import re
+from typing import TYPE_CHECKING, Iterator, List, Optional
+from agents.cache import ResultCache
+from agents.clients import ClientRegistry, get_default_registry
+from agents.llm_cache import wrapped_chat_model
+from agents.rate_limit import QuotaManager, RateLimiter
+from agents.instrumentation import get_metrics
+from agents.tokens import count_tokens, truncate_to_tokens
+from agents.chart_renderer import CHART_TYPES
+from agents.post_variants import POST_LENGTHS, PostScorer, variant_grid
+from agents.structured import BUNDLE_SCHEMA_NAME, bundle_schema, parse_json, response_format_for, validate_bundle
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from langchain_openai import ChatOpenAI
+
+REFERENCES_HEADER = "\n\n**References:**\n"
+# References kept on a summary that has been updated several times
+MAX_MERGED_REFERENCES = 10
+
+
+def _chat_messages(system: str, user: str) -> List["BaseMessage"]:
+    """System + user message pair; langchain_core is imported on first use to keep startup fast"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return [SystemMessage(content=system), HumanMessage(content=user)]
+
+
+def _merge_references(new: List[str], old: List[str]) -> List[str]:
+    """Renumbered union of two reference lists, newest first, without repeated entries"""
+    entries = []
+    for line in new + old:
+        entry = re.sub(r"^\d+\.\s*", "", line.strip())
+        if entry and entry not in entries:
+            entries.append(entry)
+    return [f"{i + 1}. {entry}" for i, entry in enumerate(entries[:MAX_MERGED_REFERENCES])]
+
 
 class SummaryAgent:
-    def __init__(self, model: str = "gpt-4", temperature: float = 0.5):
+    def __init__(self, model: str = "gpt-4", temperature: float = 0.5,
+                 cache: Optional[ResultCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 token_budget: int = 5000, map_concurrency: int = 4,
+                 clients: Optional[ClientRegistry] = None, quota: Optional[QuotaManager] = None,
+                 source_token_budget: int = 1500, cache_similarity: Optional[float] = None):
         self.model = model
         self.temperature = temperature
-        self.llm: Optional[ChatOpenAI] = None  # Will be initialized with API key
+        self.token_budget = token_budget  # Max source tokens sent in one prompt
+        self.source_token_budget = source_token_budget  # Max tokens per source once full text is attached
+        self.map_concurrency = map_concurrency  # Parallel chunk summaries when over budget
+        self.cache = cache  # Optional LLM response cache
+        self.cache_similarity = cache_similarity  # Reuse responses for near-duplicate sources text
+        self.rate_limiter = rate_limiter  # Optional OpenAI rate limiter
+        self.quota = quota  # Shared per-key limiters, used when no rate_limiter is given
+        self.clients = clients or get_default_registry()  # Shared long-lived chat models
+        self._api_key: Optional[str] = None
+        self.llm: Optional["ChatOpenAI"] = None  # Will be initialized with API key
         
     def set_api_key(self, api_key: str):
-        """Initialize the LLM with the provided API key"""
-        self.llm = ChatOpenAI(
-            model=self.model,
-            temperature=self.temperature,
-            openai_api_key=api_key
-        )
+        """Initialize the LLM with the provided API key.
+
+        The chat model comes from the client registry, so repeat calls are
+        cheap and a key that hasn't changed keeps the existing model.
+        """
+        if self.llm is not None and api_key == self._api_key:
+            return
+        llm = wrapped_chat_model(self.clients, api_key, self.model, self.temperature, "SummaryAgent",
+                                 rate_limiter=self.rate_limiter, quota=self.quota,
+                                 cache=self.cache, similarity=self.cache_similarity)
+        # Assigned once fully wrapped, so concurrent runs never see a partial chain
+        self.llm, self._api_key = llm, api_key
         
-    def _prepare_sources_text(self, sources: List[dict]) -> tuple[str, List[str]]:
-        """Helper method to format sources text and collect references"""
-        combined_text = ""
+    def _pack_sources(self, sources: List[dict]) -> tuple[List[str], List[str]]:
+        """Helper to format each source as a prompt block, skipping duplicates.
+
+        A source is dropped when its link was already seen or its text is
+        contained in (or contains) a source we kept. Each block is capped at
+        the token budget so a single huge source can't crowd out the rest.
+        """
+        blocks = []
         reference_links = []
-        
+        seen_links = set()
+        kept_texts = []  # (index into blocks, normalized text)
+
         for i, source in enumerate(sources):
-            label = "[Web Article]" if source.get("type") == "web" else "[Research Paper]"
-            combined_text += f"{label} {source.get('title', 'Untitled')}\n{source.get('summary', '')}\n\n"
+            link = source.get("link")
+            if link and link in seen_links:
+                continue
+            text = " ".join(source.get("summary", "").lower().split())
+            duplicate = False
+            for j, (block_index, kept) in enumerate(kept_texts):
+                if text and (text in kept or kept in text):
+                    duplicate = True
+                    if len(text) > len(kept):
+                        # Keep the more complete of two overlapping snippets
+                        blocks[block_index] = self._format_source(source)
+                        kept_texts[j] = (block_index, text)
+                    break
+            if duplicate:
+                continue
+
+            if link:
+                seen_links.add(link)
+            kept_texts.append((len(blocks), text))
+            blocks.append(self._format_source(source))
 
-            if "link" in source and len(reference_links) < 5:  # Limit to 5 references
-                reference_links.append(f"{i+1}. [{source['title']}]({source['link']})")
-                
-        return combined_text, reference_links
+            if link and len(reference_links) < 5:  # Limit to 5 references
+                reference_links.append(f"{i+1}. [{source.get('title', 'Untitled')}]({link})")
+
+        return blocks, reference_links
+
+    def _format_source(self, source: dict) -> str:
+        label = "[Web Article]" if source.get("type") == "web" else "[Research Paper]"
+        block = f"{label} {source.get('title', 'Untitled')}\n{source.get('summary', '')}\n\n"
+        if source.get("content"):
+            # Full text from the enrichment stage: the snippet leads, the body fills its share
+            block = block[:-1] + source["content"] + "\n\n"
+            return truncate_to_tokens(block, min(self.token_budget, self.source_token_budget), self.model)
+        return truncate_to_tokens(block, self.token_budget, self.model)
+
+    def _prepare_sources_text(self, sources: List[dict]) -> tuple[str, List[str]]:
+        """Helper method to format sources text and collect references"""
+        blocks, reference_links = self._pack_sources(sources)
+        return "".join(blocks), reference_links
+
+    def _chunk_blocks(self, blocks: List[str]) -> List[str]:
+        """Helper to group source blocks into chunks that each fit the token budget"""
+        chunks = []
+        current, current_tokens = [], 0
+        for block in blocks:
+            tokens = count_tokens(block, self.model)
+            if current and current_tokens + tokens > self.token_budget:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(block)
+            current_tokens += tokens
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+    def _map_summaries(self, chunks: List[str]) -> List[str]:
+        """Summarize each chunk concurrently (the map step of map-reduce)"""
+        def summarize_chunk(chunk: str) -> str:
+            messages = _chat_messages(
+                "You are a helpful research assistant.",
+                "Summarize the key findings of the following research content "
+                "in one or two short paragraphs:\n\n" + chunk
+            )
+            return self.llm.invoke(messages).content
+
+        with ThreadPoolExecutor(max_workers=self.map_concurrency) as executor:
+            return list(executor.map(summarize_chunk, chunks))
+
+    def _research_content(self, sources: List[dict]) -> tuple[str, bool, List[str]]:
+        """Helper to fit the sources into the token budget and collect references.
+
+        Sources that fit are returned as-is. Otherwise they are summarized in
+        budget-sized chunks first, and the partial summaries are returned
+        instead (the second value is then True).
+        """
+        blocks, reference_links = self._pack_sources(sources)
+        combined_text = "".join(blocks)
+
+        if count_tokens(combined_text, self.model) <= self.token_budget:
+            return combined_text, False, reference_links
+
+        chunks = self._chunk_blocks(blocks)
+        print(f"[SummaryAgent] Sources exceed {self.token_budget} tokens, "
+              f"summarizing {len(chunks)} chunks first...")
+        return "\n\n".join(self._map_summaries(chunks)), True, reference_links
+
+    def _summary_messages(self, sources: List[dict]) -> tuple[List["BaseMessage"], List[str]]:
+        """Helper to build the summarization prompt and collect references"""
+        content, partial, reference_links = self._research_content(sources)
+        if partial:
+            prompt = (
+                "Combine the following partial summaries of research content into a clear, "
+                "concise explanation for a general audience:\n\n" + content
+            )
+        else:
+            prompt = (
+                "Summarize the following research content into a clear, concise explanation "
+                "for a general audience:\n\n" + content
+            )
+
+        messages = _chat_messages("You are a helpful research assistant.", prompt)
+        return messages, reference_links
 
     def summarize(self, sources: List[dict]) -> str:
         """Generate a readable summary from mixed research results with references.
@@ -46,33 +202,133 @@ class SummaryAgent:
             raise RuntimeError("OpenAI API key not set. Call set_api_key() first.")
 
         print("[SummaryAgent] Summarizing combined research...")
-        combined_text, reference_links = self._prepare_sources_text(sources)
-
-        prompt = (
-            "Summarize the following research content into a clear, concise explanation "
-            "for a general audience:\n\n" + combined_text
-        )
-
-        messages = [
-            SystemMessage(content="You are a helpful research assistant."),
-            HumanMessage(content=prompt)
-        ]
+        messages, reference_links = self._summary_messages(sources)
 
         response = self.llm.invoke(messages)
         summary = response.content
 
         if reference_links:
-            summary += "\n\n**References:**\n" + "\n".join(reference_links)
+            summary += REFERENCES_HEADER + "\n".join(reference_links)
 
         return summary
 
-    def generate_posts(self, summary: str, tone: str = "professional", num_posts: int = 3) -> List[str]:
+    def stream_summary(self, sources: List[dict]) -> Iterator[str]:
+        """Streaming variant of summarize() that yields text chunks as they arrive.
+
+        Joining every yielded chunk gives the same text summarize() returns.
+
+        Raises:
+            RuntimeError: If LLM is not initialized with API key
+        """
+        if not self.llm:
+            raise RuntimeError("OpenAI API key not set. Call set_api_key() first.")
+
+        print("[SummaryAgent] Streaming summary of combined research...")
+        messages, reference_links = self._summary_messages(sources)
+
+        for chunk in self.llm.stream(messages):
+            if chunk.content:
+                yield chunk.content
+
+        if reference_links:
+            yield REFERENCES_HEADER + "\n".join(reference_links)
+
+    def update_summary(self, previous: str, sources: List[dict]) -> str:
+        """Fold new sources into an earlier summary instead of summarizing everything again.
+
+        Only the new sources are sent, alongside the previous summary text.
+        References from both are kept, newest first.
+
+        Args:
+            previous: Summary returned by summarize() or an earlier update_summary()
+            sources: Sources that the previous summary hasn't seen
+
+        Returns:
+            Updated summary with references
+
+        Raises:
+            RuntimeError: If LLM is not initialized with API key
+        """
+        if not self.llm:
+            raise RuntimeError("OpenAI API key not set. Call set_api_key() first.")
+
+        print(f"[SummaryAgent] Updating summary with {len(sources)} new sources...")
+        body, _, old_references = previous.partition(REFERENCES_HEADER)
+        content, partial, reference_links = self._research_content(sources)
+        label = "Partial summaries of new research" if partial else "New research content"
+        prompt = (
+            "Here is an existing summary written for a general audience:\n\n" + body.strip() +
+            f"\n\n{label}:\n\n" + content +
+            "\n\nUpdate the summary so it reflects the new findings. Keep what is still accurate, "
+            "say clearly what is new, and keep it clear and concise."
+        )
+        response = self.llm.invoke(_chat_messages("You are a helpful research assistant.", prompt))
+        summary = response.content
+
+        references = _merge_references(reference_links, old_references.splitlines())
+        if references:
+            summary += REFERENCES_HEADER + "\n".join(references)
+        return summary
+
+    def generate_bundle(self, sources: List[dict], tone: str = "professional", num_posts: int = 3,
+                        max_charts: int = 0) -> dict:
+        """Summary, posts and chart specs from one structured-output call.
+
+        Replaces the summarize -> generate_posts -> generate_graphs chain with a
+        single round trip. The answer must match bundle_schema(). Models with
+        structured outputs are held to it by the API; for others, malformed
+        JSON is repaired locally and, failing that, by one short follow-up call.
+
+        Args:
+            sources: List of research sources (web articles and papers)
+            tone: Desired tone of the posts
+            num_posts: Number of posts to write
+            max_charts: Upper bound on chart specs; 0 asks for none
+
+        Returns:
+            Dictionary with 'summary' (with references), 'posts' and validated 'charts'
+
+        Raises:
+            RuntimeError: If LLM is not initialized with API key
+            ValueError: If no valid answer could be obtained
+        """
+        if not self.llm:
+            raise RuntimeError("OpenAI API key not set. Call set_api_key() first.")
+
+        print(f"[SummaryAgent] Generating summary, {num_posts} posts and up to {max_charts} charts in one call...")
+        content, partial, reference_links = self._research_content(sources)
+        schema = bundle_schema(num_posts, max_charts)
+        options = {}
+        response_format = response_format_for(self.model, schema)
+        if response_format:
+            options["response_format"] = response_format
+
+        response = self.llm.invoke(self._bundle_messages(content, partial, schema, tone, num_posts, max_charts),
+                                   **options)
+        try:
+            bundle = validate_bundle(parse_json(response.content), num_posts, max_charts)
+        except ValueError as e:
+            print(f"[SummaryAgent] Invalid structured response ({e}), asking for a repair...")
+            repair = _chat_messages(
+                "You fix malformed JSON. Return only the corrected JSON object, matching the schema.",
+                f"Schema:\n{json.dumps(schema)}\n\nProblem: {e}\n\nJSON to fix:\n{response.content}"
+            )
+            response = self.llm.invoke(repair, **options)
+            bundle = validate_bundle(parse_json(response.content), num_posts, max_charts)
+
+        if reference_links:
+            bundle["summary"] += REFERENCES_HEADER + "\n".join(reference_links)
+        return bundle
+
+    def generate_posts(self, summary: str, tone: str = "professional", num_posts: int = 3,
+                       length: str = "medium") -> List[str]:
         """Generate LinkedIn-style posts from the summary.
         
         Args:
             summary: Research summary to base posts on
             tone: Desired tone ('professional', 'casual', 'enthusiastic')
             num_posts: Number of post variations to generate
+            length: 'short', 'medium' or 'long' (see POST_LENGTHS)
             
         Returns:
             List of generated post strings
@@ -85,6 +341,86 @@ class SummaryAgent:
 
         print(f"[SummaryAgent] Generating {num_posts} LinkedIn posts...")
 
+        response = self.llm.invoke(self._posts_messages(summary, tone, num_posts, length))
+        return self._parse_post_response(response.content, num_posts)
+
+    def generate_post_variants(self, summary: str, tones: List[str], lengths: List[str] = ("medium",),
+                               posts_per_variant: int = 2, drafts: Optional[List[dict]] = None) -> List[dict]:
+        """Posts in several tones and lengths from one summary, scored and ranked.
+
+        Each (tone, length) pair is one call, and the calls run concurrently,
+        so the whole set takes about as long as a single generate_posts().
+        Drafts are scored locally and near-duplicates across variants are
+        dropped (see PostScorer).
+
+        Args:
+            summary: Research summary to base posts on
+            tones: Tones to write in
+            lengths: Lengths to write in (keys of POST_LENGTHS)
+            posts_per_variant: Posts per (tone, length) pair
+            drafts: Posts already written (e.g. by generate_bundle), as dictionaries
+                with 'text', 'tone' and 'length'; their pairs aren't generated again
+
+        Returns:
+            Dictionaries with 'text', 'tone', 'length', 'score' and 'checks', best first
+
+        Raises:
+            RuntimeError: If LLM is not initialized with API key, or every variant failed
+        """
+        if not self.llm:
+            raise RuntimeError("OpenAI API key not set. Call set_api_key() first.")
+
+        drafts = list(drafts or [])
+        written = {(draft["tone"], draft["length"]) for draft in drafts}
+        variants = [pair for pair in variant_grid(tones, lengths) if pair not in written]
+        print(f"[SummaryAgent] Generating {len(variants)} post variants...")
+
+        def generate(variant: tuple) -> List[dict]:
+            tone, length = variant
+            try:
+                posts = self.generate_posts(summary, tone, posts_per_variant, length)
+            except Exception as e:
+                print(f"[SummaryAgent] Variant {tone}/{length} failed: {e}")
+                return []
+            return [{"text": post, "tone": tone, "length": length} for post in posts]
+
+        if variants:
+            with ThreadPoolExecutor(max_workers=self.map_concurrency) as executor:
+                for posts in executor.map(generate, variants):
+                    drafts.extend(posts)
+        if not drafts:
+            raise RuntimeError("No post variant could be generated.")
+
+        ranked = PostScorer().rank(drafts)
+        get_metrics().incr("post_duplicates_dropped", len(drafts) - len(ranked))
+        return ranked
+
+    def stream_posts(self, summary: str, tone: str = "professional",
+                     num_posts: int = 3, length: str = "medium") -> Iterator[tuple[List[str], str]]:
+        """Streaming variant of generate_posts().
+
+        Yields:
+            Tuples of (finished posts so far, text of the post still being written)
+
+        Raises:
+            RuntimeError: If LLM is not initialized with API key
+        """
+        if not self.llm:
+            raise RuntimeError("OpenAI API key not set. Call set_api_key() first.")
+
+        print(f"[SummaryAgent] Streaming {num_posts} LinkedIn posts...")
+        parser = PostStreamParser(expected=num_posts)
+
+        for chunk in self.llm.stream(self._posts_messages(summary, tone, num_posts, length)):
+            if chunk.content:
+                parser.feed(chunk.content)
+                yield list(parser.posts), parser.current
+
+        yield parser.close(), ""
+
+    def _posts_messages(self, summary: str, tone: str, num_posts: int,
+                        length: str = "medium") -> List["BaseMessage"]:
+        """Helper to build the post generation prompt"""
         system_prompt = f"""You are a professional content writer for LinkedIn.
             Using the research summary below, write {num_posts} LinkedIn posts that are:
             - Insightful and informative
@@ -93,33 +429,105 @@ class SummaryAgent:
             - Each post should stand on its own
             - Include relevant hashtags (3-5)
             - Format with clear paragraphs and line breaks
-            - Length: 3-5 paragraphs each
+            - Length: {POST_LENGTHS[length]["prompt"]} each
             ---
-            Return ONLY the posts, numbered as:
+            Return ONLY the posts, numbered and separated by a blank line, as:
             1. [First post content]
+
             2. [Second post content]
             etc."""
 
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Research Summary:\n{summary}")
-        ]
-
-        response = self.llm.invoke(messages)
-        return self._parse_post_response(response.content)
+        return _chat_messages(system_prompt, f"Research Summary:\n{summary}")
         
-    def _parse_post_response(self, response_text: str) -> List[str]:
+    def _bundle_messages(self, content: str, partial: bool, schema: dict, tone: str,
+                         num_posts: int, max_charts: int) -> List["BaseMessage"]:
+        """Helper to build the fused summary/posts/charts prompt"""
+        charts = (
+            f"- charts: 1 to {max_charts} charts of quantitative findings from the research, "
+            "each with title, x_label, y_label, x_data, y_data (numbers) and type "
+            f"({', '.join(CHART_TYPES)}). Use only figures the research supports.\n"
+            if max_charts else ""
+        )
+        system_prompt = (
+            "You are a research assistant and professional content writer for LinkedIn. "
+            f"Answer with a single JSON object ({BUNDLE_SCHEMA_NAME}) with these fields:\n"
+            "- summary: a clear, concise explanation of the research for a general audience\n"
+            f"- posts: exactly {num_posts} LinkedIn posts, each a separate string. Each post is insightful, "
+            f"uses a {tone.lower()} tone, avoids jargon, stands on its own, has 3-5 paragraphs "
+            "separated by blank lines and ends with 3-5 relevant hashtags\n"
+            + charts +
+            f"Return only JSON matching this schema:\n{json.dumps(schema)}"
+        )
+        label = "Partial summaries of research content" if partial else "Research content"
+        return _chat_messages(system_prompt, f"{label}:\n\n{content}")
+
+    def _parse_post_response(self, response_text: str, num_posts: Optional[int] = None) -> List[str]:
         """Helper to parse the LLM response into separate posts"""
-        posts = []
-        current_post = []
-        
-        for line in response_text.split('\n'):
-            if line.startswith(('1.', '2.', '3.', '4.', '5.')) and current_post:
-                posts.append('\n'.join(current_post).strip())
-                current_post = []
-            current_post.append(line)
-            
-        if current_post:
-            posts.append('\n'.join(current_post).strip())
-            
-        return posts or [response_text.strip()]  # Fallback if parsing fails
\ No newline at end of file
+        parser = PostStreamParser(expected=num_posts)
+        parser.feed(response_text)
+        return parser.close() or [response_text.strip()]  # Fallback if parsing fails
+
+
+class PostStreamParser:
+    """Incrementally splits a numbered list of posts as the text streams in.
+
+    A new post starts at a line beginning with the next expected number
+    ("1.", then "2.", ...) that opens the response or follows a blank line.
+    A numbered list inside a post only splits it if the list is preceded by
+    a blank line and happens to continue the post numbering.
+
+    Models don't always leave the blank line. If close() finds fewer than
+    the expected number of posts, the whole text is split again at every
+    line starting with the next number.
+    """
+
+    def __init__(self, expected: Optional[int] = None, strict: bool = True):
+        self.expected = expected
+        self.strict = strict  # False: any line starting with the next number starts a post
+        self.posts: List[str] = []
+        self._text: List[str] = []  # Everything fed so far, for the non-strict pass
+        self._lines: List[str] = []  # Complete lines of the post in progress
+        self._partial = ""  # Trailing text not yet terminated by a newline
+        self._next_number = 1
+        self._after_blank = True  # Start of the response counts as following a blank line
+
+    @property
+    def current(self) -> str:
+        """Text of the post currently being written"""
+        return "\n".join(self._lines + [self._partial]).strip()
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk of text and return any posts it completed"""
+        self._text.append(chunk)
+        *lines, self._partial = (self._partial + chunk).split("\n")
+        completed = []
+        for line in lines:
+            if (self._after_blank or not self.strict) and line.startswith(f"{self._next_number}."):
+                self._next_number += 1
+                post = self._flush()
+                if post:
+                    completed.append(post)
+            self._lines.append(line)
+            self._after_blank = not line.strip()
+        return completed
+
+    def close(self) -> List[str]:
+        """Finish the last post and return every parsed post"""
+        text = "".join(self._text)
+        if self._partial:
+            self.feed("\n")
+        self._flush()
+        if self.strict and self.expected and len(self.posts) < self.expected:
+            loose = PostStreamParser(strict=False)
+            loose.feed(text)
+            if len(loose.close()) > len(self.posts):
+                self.posts = loose.posts
+        return self.posts
+
+    def _flush(self) -> Optional[str]:
+        post = "\n".join(self._lines).strip()
+        self._lines = []
+        if post:
+            self.posts.append(post)
+            return post
+        return None
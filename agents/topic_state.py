@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+from agents.ranking import canonicalize_url
+
+DEFAULT_TOPIC_STATE_PATH = os.path.join(".cache", "topics.sqlite3")
+
+_ARXIV_PREFIX = "arxiv.org/abs/"
+
+
+class TopicStateStore:
+    def __init__(self, path: Optional[str] = DEFAULT_TOPIC_STATE_PATH):
+        """What has already been researched for each topic, so a refresh only handles what's new.
+
+        Per normalized topic it keeps the ids of every source that went into
+        the summary, the summary itself and when it was last brought up to date.
+
+        Args:
+            path: SQLite file for topic state, or None to keep it in memory
+        """
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS topics ("
+            "key TEXT PRIMARY KEY, topic TEXT, seen TEXT, summary TEXT, updated_at REAL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, topic: str) -> Optional[dict]:
+        """Saved state for a topic, or None if it was never researched.
+
+        Returns:
+            Dictionary with 'topic', 'seen' (a set of source ids), 'summary'
+            and 'updated_at' (Unix time the sources were fetched)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT topic, seen, summary, updated_at FROM topics WHERE key = ?", (_topic_key(topic),)
+            ).fetchone()
+        if row is None:
+            return None
+        # Ids saved before they were canonicalized are brought up to date on read
+        seen = {_canonical_id(seen_id) for seen_id in json.loads(row[1])}
+        return {"topic": row[0], "seen": seen, "summary": row[2], "updated_at": row[3]}
+
+    def save(self, topic: str, summary: str, seen: Iterable[str], updated_at: Optional[float] = None):
+        """Replace a topic's state; seen should include every source id already summarized"""
+        updated_at = time.time() if updated_at is None else updated_at
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO topics (key, topic, seen, summary, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (_topic_key(topic), topic, json.dumps(sorted(seen)), summary, updated_at)
+            )
+            self._db.commit()
+
+    def forget(self, topic: str):
+        """Drop a topic's state so its next refresh is a full run"""
+        with self._lock:
+            self._db.execute("DELETE FROM topics WHERE key = ?", (_topic_key(topic),))
+            self._db.commit()
+
+    def topics(self) -> List[dict]:
+        """Every tracked topic with its last update, most recent first"""
+        with self._lock:
+            rows = self._db.execute("SELECT topic, updated_at FROM topics ORDER BY updated_at DESC").fetchall()
+        return [{"topic": topic, "updated_at": updated_at} for topic, updated_at in rows]
+
+
+def source_id(source: dict) -> Optional[str]:
+    """Stable id for a source: 'arxiv:<id>' without the version for papers, else the
+    canonical URL the ranker de-duplicates on (see ranking.canonicalize_url)"""
+    link = (source.get("link") or "").strip()
+    if not link:
+        return None
+    url = canonicalize_url(link)
+    if url.startswith(_ARXIV_PREFIX):
+        return f"arxiv:{url[len(_ARXIV_PREFIX):]}"
+    return url
+
+
+def _canonical_id(seen_id: str) -> str:
+    if seen_id.startswith("arxiv:"):
+        return seen_id
+    return canonicalize_url(f"//{seen_id}")  # Saved ids have no scheme
+
+
+def _topic_key(topic: str) -> str:
+    return " ".join(topic.lower().split())
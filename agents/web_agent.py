@@ -1,19 +1,33 @@
 import requests
+from datetime import datetime
+from typing import Optional
+from agents.cache import ResultCache
+from agents.rate_limit import QuotaManager, RateLimiter
+from agents.http_client import HttpClient, get_default_client
+from agents.instrumentation import get_metrics
 
 class WebResearchAgent:
-    def __init__(self, max_results=5):
+    def __init__(self, max_results=5, engine: str = "google", cache: Optional[ResultCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, http: Optional[HttpClient] = None,
+                 quota: Optional[QuotaManager] = None):
         self.api_key = None  # Will be set via set_api_key
         self.max_results = max_results
+        self.engine = engine
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.quota = quota  # Shared per-key limiters, used when no rate_limiter is given
+        self.http = http or get_default_client()
 
     def set_api_key(self, api_key: str):
         """Set the SERP API key dynamically."""
         self.api_key = api_key
 
-    def run(self, query: str) -> list:
+    def run(self, query: str, since: Optional[datetime] = None) -> list:
         """Search web using SerpAPI and return structured results.
         
         Args:
             query: Search query string
+            since: Only return pages Google dates on or after this day
             
         Returns:
             List of article dictionaries or empty list if error occurs
@@ -22,18 +36,35 @@ class WebResearchAgent:
             print("[WebResearchAgent] Error: API key not set")
             return []
 
+        cache_key = None
+        if self.cache:
+            window = {"since": since.date().isoformat()} if since else {}
+            cache_key = self.cache.make_key("web", query, engine=self.engine, num=self.max_results, **window)
+            cached = self.cache.get("web", cache_key)
+            if cached is not None:
+                print(f"[WebResearchAgent] Cache hit for: {query}")
+                return cached
+
         print(f"[WebResearchAgent] Searching web for: {query}")
         params = {
             "q": query,
             "api_key": self.api_key,
-            "engine": "google",
+            "engine": self.engine,
             "num": self.max_results
         }
+        if since:
+            # Google's custom date range; day granularity is the finest it offers
+            params["tbs"] = f"cdr:1,cd_min:{since:%m/%d/%Y}"
 
+        rate_limiter = self.rate_limiter or (self.quota.limiter("serpapi", self.api_key) if self.quota else None)
         try:
-            res = requests.get("https://serpapi.com/search", params=params)
-            res.raise_for_status()  # Raises exception for 4XX/5XX responses
-            results = res.json()
+            with get_metrics().span("web.search", engine=self.engine) as span:
+                res = self.http.get("https://serpapi.com/search", params=params, rate_limiter=rate_limiter)
+                res.raise_for_status()  # Raises exception for 4XX/5XX responses
+                results = res.json()
+                span["results"] = len(results.get("organic_results", []))
+            if rate_limiter:
+                rate_limiter.record()
 
             articles = []
             for result in results.get("organic_results", [])[:self.max_results]:
@@ -44,6 +75,8 @@ class WebResearchAgent:
                     "link": result.get("link", "")
                 })
 
+            if self.cache and articles:
+                self.cache.set("web", cache_key, articles)
             return articles
 
         except requests.exceptions.RequestException as e:
@@ -1,8 +1,37 @@
+import base64
 import streamlit as st
+from agents.cache import ResultCache
+from agents.chart_renderer import enable_process_pool
+from agents.clients import ClientRegistry
 from agents.coordinator import ResearchCoordinator
-
-# Initialize the ResearchCoordinator
-coordinator = ResearchCoordinator()
+from agents.enrichment import FullTextEnricher
+from agents.image_store import ImageStore
+from agents.jobs import JobQueue
+from agents.llm_cache import DEFAULT_LLM_CACHE_PATH
+from agents.paper_agent import ARXIV_CALLS_PER_MINUTE
+from agents.post_variants import POST_LENGTHS, TONES
+from agents.rate_limit import RateLimiter
+
+@st.cache_resource
+def get_shared_resources() -> dict:
+    """Clients, caches and limiters built once per server process and shared by every session"""
+    # Streamlit's own launcher is __main__, so spawned chart workers never re-run this page
+    enable_process_pool()
+    return {
+        "clients": ClientRegistry(),
+        "cache": ResultCache(),
+        "llm_cache": ResultCache(path=DEFAULT_LLM_CACHE_PATH, max_disk_entries=2000),
+        "image_store": ImageStore(),
+        # One fetch pool, so per-host politeness holds across sessions
+        "enricher": FullTextEnricher(),
+        # arXiv's request limit applies to the whole server, not to each session
+        "rate_limits": {"arxiv": RateLimiter(ARXIV_CALLS_PER_MINUTE)},
+    }
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Research runs on the queue's workers, each job with its own coordinator on the shared resources"""
+    return JobQueue(lambda: ResearchCoordinator(**get_shared_resources()))
 
 def set_api_keys():
     with st.form("API Keys", clear_on_submit=False):
@@ -18,6 +47,23 @@ def set_api_keys():
             st.session_state["serp_key"] = serp_key
             st.success("API keys saved!")
 
+def render_posts(posts, current="", variants=None):
+    """Render finished posts plus the draft that is still streaming in; ranked variants show their tone and score"""
+    if not posts and not current:
+        st.write("No posts generated.")
+        return
+    if variants:
+        for i, variant in enumerate(variants, 1):
+            st.markdown(f"**Post Option {i}** · {variant['tone']}, {variant['length']} · score {variant['score']:.2f}")
+            st.write(variant["text"])
+        return
+    for i, post in enumerate(posts, 1):
+        st.markdown(f"**Post Option {i}**")
+        st.write(post)
+    if current:
+        st.markdown(f"**Post Option {len(posts) + 1}**")
+        st.write(current)
+
 def main():
     st.title("Research Assistant and LinkedIn Post Generator")
     st.write("Welcome! Provide a research topic and let the assistant find the latest articles and papers for you.")
@@ -45,50 +91,95 @@ def main():
         st.stop()
 
     # Toggles for images and graphs
-    col1, col2 = st.columns(2)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         generate_images = st.toggle("Generate Images (DALL·E)", value=False)
     with col2:
         generate_graphs = st.toggle("Generate Graphs", value=False)
+    with col3:
+        fused = st.toggle("Single-call mode", value=False,
+                          help="Write the summary, posts and charts in one LLM call. Faster, but nothing streams.")
+    with col4:
+        enrich = st.toggle("Read full text", value=False,
+                           help="Summarize the full pages and papers instead of search snippets and abstracts.")
+
+    col5, col6 = st.columns(2)
+    with col5:
+        tones = st.multiselect("Post tones", TONES, default=["professional"],
+                               help="Several tones or lengths are written at once and ranked.")
+    with col6:
+        post_lengths = st.multiselect("Post lengths", list(POST_LENGTHS), default=["medium"])
 
     topic = st.text_input("Enter the research topic", "")
 
     if st.button("Search") and topic:
-        st.write(f"🔎 Researching: {topic}...")
-
-        # Pass toggles and API keys to coordinator
-        result = coordinator.run(
+        # The job id lives in the session, so the research survives reruns;
+        # searching again for a topic already in flight joins that job
+        st.session_state["job_id"] = get_job_queue().submit(
             topic,
             openai_api_key=openai_key,
             serp_api_key=serp_key,
             generate_images=generate_images,
-            generate_graphs=generate_graphs
+            generate_graphs=generate_graphs,
+            fused=fused,
+            enrich=enrich,
+            tones=tones,
+            post_lengths=post_lengths
         )
+    elif topic == "" and "job_id" not in st.session_state:
+        st.write("Please enter a topic to begin the search.")
 
-        st.subheader("Summary of Findings:")
-        st.write(result.get("summary", "No research found."))
-
-        st.subheader("LinkedIn Post Drafts:")
-        posts = result.get("posts", [])
-        if posts:
-            for i, post in enumerate(posts, 1):
-                st.markdown(f"**Post Option {i}**")
-                st.write(post)
+    if "job_id" in st.session_state:
+        job = get_job_queue().get(st.session_state["job_id"])
+        if job is None:
+            del st.session_state["job_id"]
+        elif job["state"] in ("queued", "running"):
+            show_job_progress(job["id"])
         else:
-            st.write("No posts generated.")
-
-        if generate_images and result.get("images"):
-            st.subheader("Generated Images:")
-            for img_url in result["images"]:
-                st.image(img_url)
-
-        if generate_graphs and result.get("graphs"):
-            st.subheader("Generated Graphs:")
-            for fig in result["graphs"]:
-                st.pyplot(fig)
-
-    elif topic == "":
-        st.write("Please enter a topic to begin the search.")
+            show_job_result(job)
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id):
+    """Poll the job once a second, redrawing only this part of the page"""
+    job = get_job_queue().get(job_id)
+    if job["state"] not in ("queued", "running"):
+        st.rerun()  # Finished: redraw the whole page with the result
+
+    st.write(f"🔎 Researching: {job['topic']}...")
+    st.caption(job["message"])
+    st.subheader("Summary of Findings:")
+    st.markdown(job["progress"]["summary"] or "...")
+    st.subheader("LinkedIn Post Drafts:")
+    render_posts(job["progress"]["posts"], job["progress"]["current"])
+
+def show_job_result(job):
+    st.write(f"🔎 Research on: {job['topic']}")
+    if job["state"] == "failed":
+        st.error(f"Research failed: {job['error']}")
+        return
+
+    result = job["result"]
+    st.subheader("Summary of Findings:")
+    st.markdown(result.get("summary", "No research found."))
+    st.subheader("LinkedIn Post Drafts:")
+    render_posts(result.get("posts", []), variants=result.get("post_variants"))
+
+    if job["options"]["generate_images"] and result.get("images"):
+        st.subheader("Generated Images:")
+        image_store = get_shared_resources()["image_store"]
+        for image_id in result["images"]:
+            # LinkedIn-sized JPEG straight from the local store
+            st.image(image_store.path(image_id, "linkedin"))
+
+    if job["options"]["generate_graphs"] and result.get("graphs"):
+        st.subheader("Generated Graphs:")
+        for graph in result["graphs"]:
+            data = base64.b64decode(graph)
+            # SVG charts are passed as markup, PNG charts as bytes
+            if data.lstrip().startswith((b"<?xml", b"<svg")):
+                st.image(data.decode("utf-8"))
+            else:
+                st.image(data)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""Headless batch runner: research many topics and write the results as JSONL.
+
+Usage:
+    python batch.py topics.txt --output results.jsonl --concurrency 4
+    cat topics.txt | python batch.py - --output results.jsonl
+
+API keys are read from OPENAI_API_KEY and SERP_API_KEY (a .env file works too).
+The output file doubles as the checkpoint: topics that already have a
+successful line in it are skipped, so an interrupted run can simply be restarted.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import sys
+import threading
+import time
+from typing import Iterable, List, Set
+
+from dotenv import load_dotenv
+from agents.chart_renderer import enable_process_pool
+from agents.coordinator import ResearchCoordinator
+from agents.image_store import ImageStore
+from agents.jobs import serialize_result
+from agents.post_variants import POST_LENGTHS, TONES
+from agents.rate_limit import QuotaManager, RateLimiter
+from agents.instrumentation import get_metrics, profile
+
+
+def read_topics(source: Iterable[str]) -> List[str]:
+    """One topic per line; blank lines, '#' comments and duplicates are skipped"""
+    topics = []
+    seen = set()
+    for line in source:
+        topic = line.strip()
+        if topic and not topic.startswith("#") and topic not in seen:
+            seen.add(topic)
+            topics.append(topic)
+    return topics
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """Return topics that already finished successfully in a previous run"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A crash mid-write can leave a truncated last line
+            if record.get("status") == "ok":
+                completed.add(record["topic"])
+    return completed
+
+
+def to_record(topic: str, result: dict, elapsed: float, image_store: ImageStore = None) -> dict:
+    """Make a coordinator result JSON-serializable"""
+    record = {"topic": topic, "status": "ok", "elapsed": round(elapsed, 3), **serialize_result(result)}
+    if "new_sources" in result:
+        record["new_sources"] = result["new_sources"]
+    if image_store:
+        # Stored images are referenced by their path on disk
+        record["images"] = [image_store.path(image_id) for image_id in record["images"]]
+    return record
+
+
+def run_batch(topics: List[str], output_path: str, openai_api_key: str, serp_api_key: str,
+              concurrency: int = 4, generate_images: bool = False, generate_graphs: bool = False,
+              rate_limits: dict = None, fused: bool = False, refresh: bool = False,
+              enrich: bool = False, tones: List[str] = None, post_lengths: List[str] = None,
+              cache_similarity: float = None) -> dict:
+    """Research every topic not yet in the output file, appending one JSON line per topic.
+
+    Args:
+        topics: Topics to research
+        output_path: JSONL file that results are appended to
+        openai_api_key: API key for OpenAI services
+        serp_api_key: API key for SERP (web search)
+        concurrency: Maximum number of topics in flight at once
+        generate_images: Whether to generate images
+        generate_graphs: Whether to generate graphs
+        rate_limits: Quota by provider ('serpapi', 'arxiv', 'openai', 'openai_images'): calls
+            per minute, or a dict of RateLimiter arguments such as tokens_per_minute
+        fused: Write summary, posts and chart specs in one LLM call per topic
+        refresh: Only research and summarize what's new since each topic's last refresh
+        enrich: Summarize the full text of pages and papers instead of snippets
+        tones: Post tones; several tones or lengths are written concurrently and ranked
+        post_lengths: Post lengths ('short', 'medium', 'long')
+        cache_similarity: Reuse cached LLM responses whose sources text is at least this
+            similar (estimated Jaccard, e.g. 0.9); None reuses exact matches only
+
+    Returns:
+        Counts of 'ok', 'failed' and 'skipped' topics
+    """
+    completed = load_completed(output_path)
+    pending = [topic for topic in topics if topic not in completed]
+    counts = {"ok": 0, "failed": 0, "skipped": len(topics) - len(pending)}
+    print(f"[Batch] {len(pending)} topics to research, {counts['skipped']} already done.")
+
+    quotas = {provider: limit if isinstance(limit, dict) else {"calls_per_minute": limit}
+              for provider, limit in (rate_limits or {}).items()}
+    # arXiv has no API key, so its limiter is fixed; the others are shared per key
+    limiters = {"arxiv": RateLimiter(**quotas.pop("arxiv"))} if "arxiv" in quotas else {}
+    quota = QuotaManager(quotas=quotas)
+    coordinator = ResearchCoordinator(rate_limits=limiters, fused=fused, quota=quota, enrich=enrich,
+                                      tones=tones, post_lengths=post_lengths, cache_similarity=cache_similarity)
+    write_lock = threading.Lock()
+
+    def research(topic: str) -> dict:
+        started = time.monotonic()
+        try:
+            research_topic = coordinator.refresh if refresh else coordinator.run
+            result = research_topic(
+                topic,
+                openai_api_key=openai_api_key,
+                serp_api_key=serp_api_key,
+                generate_images=generate_images,
+                generate_graphs=generate_graphs
+            )
+            return to_record(topic, result, time.monotonic() - started, coordinator.image_store)
+        except Exception as e:
+            return {"topic": topic, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(research, topic) for topic in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record) + "\n")
+                # Flush every line so the checkpoint survives a crash
+                out.flush()
+                os.fsync(out.fileno())
+            counts[record["status"]] += 1
+            print(f"[Batch] {record['status']}: {record['topic']} "
+                  f"({counts['ok'] + counts['failed']}/{len(pending)})")
+
+    for entry in quota.ledger():
+        print(f"[Batch] {entry['provider']}: {entry['requests']} requests, "
+              f"{entry['input_tokens'] + entry['output_tokens']} tokens, ~${entry['cost_usd']:.2f}")
+
+    return counts
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Research many topics and write LinkedIn posts as JSONL.")
+    parser.add_argument("topics", help="File with one topic per line, or '-' for stdin")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL output and checkpoint file")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Topics researched at once")
+    parser.add_argument("--images", action="store_true", help="Generate images (DALL·E)")
+    parser.add_argument("--graphs", action="store_true", help="Generate graphs")
+    parser.add_argument("--fused", action="store_true",
+                        help="One structured LLM call for summary, posts and charts instead of three")
+    parser.add_argument("--full-text", action="store_true",
+                        help="Fetch the linked pages and PDFs and summarize their full text")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Update each topic with only what's new since its last refresh "
+                             "(use a new output file per run, e.g. one per day)")
+    parser.add_argument("--tones", nargs="+", choices=TONES, default=["professional"],
+                        help="Post tones; more than one tone or length writes them all and ranks the drafts")
+    parser.add_argument("--lengths", nargs="+", choices=list(POST_LENGTHS), default=["medium"],
+                        help="Post lengths")
+    parser.add_argument("--cache-similarity", type=float,
+                        help="Also reuse cached LLM answers for near-duplicate sources text at this "
+                             "similarity (0-1, e.g. 0.9)")
+    parser.add_argument("--serpapi-rpm", type=float, default=30, help="SerpAPI calls per minute")
+    parser.add_argument("--arxiv-rpm", type=float, default=20, help="arXiv calls per minute")
+    parser.add_argument("--openai-rpm", type=float, default=60, help="OpenAI chat calls per minute")
+    parser.add_argument("--openai-tpm", type=float, default=90000,
+                        help="OpenAI tokens per minute; lowered if the API reports a smaller limit")
+    parser.add_argument("--images-rpm", type=float, default=5, help="OpenAI image calls per minute")
+    parser.add_argument("--metrics", help="Append span timings and counters to this JSON lines file")
+    parser.add_argument("--prometheus", help="Write metrics in Prometheus text format to this file")
+    parser.add_argument("--profile", help="Write cProfile stats, worker threads included, to this file")
+    args = parser.parse_args(argv)
+    # batch.py keeps its top level behind a main guard, so spawned render workers can import it
+    enable_process_pool()
+
+    load_dotenv()
+    openai_key = os.environ.get("OPENAI_API_KEY")
+    serp_key = os.environ.get("SERP_API_KEY")
+    if not openai_key or not serp_key:
+        print("[Batch] Error: OPENAI_API_KEY and SERP_API_KEY must be set", file=sys.stderr)
+        return 2
+
+    if args.topics == "-":
+        topics = read_topics(sys.stdin)
+    else:
+        with open(args.topics, encoding="utf-8") as f:
+            topics = read_topics(f)
+
+    with profile(args.profile):
+        counts = run_batch(
+            topics,
+            args.output,
+            openai_api_key=openai_key,
+            serp_api_key=serp_key,
+            concurrency=args.concurrency,
+            generate_images=args.images,
+            generate_graphs=args.graphs,
+            rate_limits={
+                "serpapi": args.serpapi_rpm,
+                "arxiv": args.arxiv_rpm,
+                "openai": {"calls_per_minute": args.openai_rpm, "tokens_per_minute": args.openai_tpm},
+                "openai_images": args.images_rpm,
+            },
+            fused=args.fused,
+            refresh=args.refresh,
+            enrich=args.full_text,
+            tones=args.tones,
+            post_lengths=args.lengths,
+            cache_similarity=args.cache_similarity
+        )
+
+    if args.metrics:
+        get_metrics().write_json_log(args.metrics)
+    if args.prometheus:
+        with open(args.prometheus, "w", encoding="utf-8") as f:
+            f.write(get_metrics().to_prometheus())
+    print(f"[Batch] Done: {counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} skipped.")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
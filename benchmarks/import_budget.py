@@ -0,0 +1,118 @@
+"""Cold-start budget for the agents package and the Streamlit app.
+
+Each target is imported in a fresh interpreter, several times, and the
+fastest run is compared with its budget. The check also fails if a heavy
+optional dependency (matplotlib, Pillow, the OpenAI SDKs) is loaded at
+startup. Those must only be imported once graphs, images or LLM calls are
+actually used.
+
+Usage (from the repository root):
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --runs 10 --scale 1.5   # looser budget on slow machines
+
+Exits with status 1 when a target is over budget or loads a deferred module.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay out of a cold start
+DEFERRED_MODULES = ("matplotlib", "PIL", "openai", "langchain_openai", "langchain_core", "httpx")
+
+# Seconds from first import to a constructed coordinator, excluding the interpreter itself
+BUDGETS = {
+    "agents.coordinator": 0.6,
+    "app": 0.8,
+}
+
+# Timed in the child interpreter; prints one JSON line
+PROBES = {
+    "agents.coordinator": """
+import time
+started = time.perf_counter()
+from agents.coordinator import ResearchCoordinator
+ResearchCoordinator()
+elapsed = time.perf_counter() - started
+""",
+    # Streamlit's own import cost is outside our control, so it is paid before the timer
+    "app": """
+import time
+import streamlit
+started = time.perf_counter()
+import app
+app.ResearchCoordinator(**app.get_shared_resources())
+elapsed = time.perf_counter() - started
+""",
+}
+
+REPORT = """
+import json, sys
+loaded = sorted({name.split(".")[0] for name in sys.modules} & set(%r))
+print(json.dumps({"seconds": elapsed, "loaded": loaded}))
+"""
+
+
+def probe(target: str, workdir: str) -> Optional[dict]:
+    """Run one probe in a fresh interpreter; None if the target can't be imported here"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))}
+    code = PROBES[target] + REPORT % (DEFERRED_MODULES,)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        if "ModuleNotFoundError: No module named 'streamlit'" in completed.stderr:
+            return None
+        raise RuntimeError(f"Probe for {target} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(target: str, runs: int) -> Optional[Dict[str, object]]:
+    """Fastest of several cold imports, plus any deferred modules that got loaded"""
+    # A scratch working directory so the default .cache/ files don't touch the repo
+    with tempfile.TemporaryDirectory(prefix="import_budget_") as workdir:
+        results = []
+        for _ in range(runs):
+            result = probe(target, workdir)
+            if result is None:
+                return None
+            results.append(result)
+    loaded = sorted({name for result in results for name in result["loaded"]})
+    return {"seconds": min(result["seconds"] for result in results), "loaded": loaded}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check cold-start import time against a budget.")
+    parser.add_argument("--target", action="append", choices=sorted(PROBES),
+                        help="Target to check; repeat for several (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per target; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier on every budget")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for target in args.target or sorted(PROBES):
+        result = measure(target, args.runs)
+        if result is None:
+            print(f"{target:<20} skipped (dependencies not installed)")
+            continue
+
+        budget = BUDGETS[target] * args.scale
+        print(f"{target:<20} {result['seconds']:.3f}s (budget {budget:.3f}s)")
+        if result["seconds"] > budget:
+            print(f"REGRESSION [{target}] startup took {result['seconds']:.3f}s, over the {budget:.3f}s budget")
+            failed = True
+        if result["loaded"]:
+            print(f"REGRESSION [{target}] loaded at startup: {', '.join(result['loaded'])}")
+            failed = True
+
+    if not failed:
+        print("\nStartup is within budget.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Offline stand-ins for SerpAPI, arXiv and OpenAI that replay recorded responses.
+
+Each stand-in sleeps for a latency drawn from a log-normal distribution fitted
+to a provider's median and p95, so the pipeline sees realistic timing without
+touching the network.
+"""
+from io import BytesIO
+import json
+import math
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from agents.http_client import HttpClient
+from agents.tokens import count_tokens
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (median, p95) in seconds, roughly what the real providers show
+DEFAULT_LATENCIES = {
+    "serpapi": (0.9, 2.0),
+    "arxiv": (0.6, 1.8),
+    "image_download": (0.3, 0.8),
+    "page": (0.4, 1.5),
+    "chat_first_token": (0.6, 1.5),
+    "chat_per_token": (0.02, 0.03),
+    "image_generate": (9.0, 15.0),
+}
+
+
+class LatencyModel:
+    def __init__(self, latencies: Optional[Dict[str, Tuple[float, float]]] = None,
+                 scale: float = 1.0, seed: int = 0):
+        """Log-normal latency per provider.
+
+        Args:
+            latencies: (median, p95) seconds per provider, merged over DEFAULT_LATENCIES
+            scale: Multiplier applied to every sample, to keep benchmark runs short
+            seed: Seed so repeated runs draw the same sequence
+        """
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.scale = scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, provider: str) -> float:
+        median, p95 = self.latencies[provider]
+        sigma = math.log(p95 / median) / 1.645 if p95 > median else 0.0
+        with self._lock:
+            value = self._rng.lognormvariate(math.log(median), sigma)
+        return value * self.scale
+
+    def sleep(self, provider: str):
+        time.sleep(self.sample(provider))
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+class ReplaySession:
+    """Drop-in for requests.Session.get() that serves fixture files by host"""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.routes = {
+            "serpapi.com": ("serpapi", load_fixture("serpapi_search.json"), "application/json"),
+            "export.arxiv.org": ("arxiv", load_fixture("arxiv_query.xml"), "application/atom+xml"),
+            "images.example.com": ("image_download", _placeholder_png(), "image/png"),
+        }
+        # Every recorded search result links to the same recorded article page
+        article = load_fixture("article.html")
+        search = json.loads(load_fixture("serpapi_search.json"))
+        for result in search.get("organic_results", []):
+            host = urlsplit(result.get("link", "")).netloc
+            self.routes.setdefault(host, ("page", article, "text/html; charset=utf-8"))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.url = url
+        parts = urlsplit(url)
+        route = self.routes.get(parts.netloc)
+        # No paper PDFs are recorded, only the arXiv API feed
+        if route is None or parts.path.startswith("/pdf/"):
+            response.status_code = 404
+            response._content = b""
+            response._content_consumed = True
+            response.raw = BytesIO(b"")
+            return response
+
+        provider, body, content_type = route
+        self.latency.sleep(provider)
+        response.status_code = 200
+        response.headers["Content-Type"] = content_type
+        response.headers["Content-Length"] = str(len(body))
+        response.encoding = "utf-8"
+        response._content = body
+        # Lets iter_content() replay the body when callers stream
+        response._content_consumed = True
+        response.raw = BytesIO(body)
+        return response
+
+    def close(self):
+        pass
+
+
+class ReplayHttpClient(HttpClient):
+    """The real HttpClient (retries, stats, metrics) on top of ReplaySession"""
+
+    def __init__(self, latency: LatencyModel, **kwargs):
+        super().__init__(**kwargs)
+        self.session = ReplaySession(latency)
+
+
+class ReplayChatModel:
+    def __init__(self, responses: Dict[str, str], latency: LatencyModel,
+                 model: str = "gpt-4", temperature: float = 0.5, **_):
+        """Chat model stand-in that answers from recorded responses by prompt type"""
+        self.responses = responses
+        self.latency = latency
+        self.model_name = model
+        self.temperature = temperature
+
+    def invoke(self, messages, **_) -> AIMessage:
+        prompt, content = self._answer(messages)
+        self.latency.sleep("chat_first_token")
+        output_tokens = count_tokens(content)
+        time.sleep(sum(self.latency.sample("chat_per_token") for _ in range(output_tokens)))
+        return AIMessage(content=content, usage_metadata=_usage(prompt, content))
+
+    def stream(self, messages, **_):
+        prompt, content = self._answer(messages)
+        self.latency.sleep("chat_first_token")
+        words = content.split(" ")
+        for i in range(0, len(words), 4):
+            piece = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+            time.sleep(sum(self.latency.sample("chat_per_token") for _ in range(count_tokens(piece))))
+            yield AIMessageChunk(content=piece)
+        yield AIMessageChunk(content="", usage_metadata=_usage(prompt, content))
+
+    def _answer(self, messages) -> Tuple[str, str]:
+        prompt = "\n".join(
+            m.content if isinstance(m, BaseMessage) else m.get("content", "") for m in messages
+        )
+        if "research_bundle" in prompt:
+            return prompt, self.responses["fused"]
+        if "data visualization" in prompt:
+            return prompt, self.responses["graph"]
+        if "content writer for LinkedIn" in prompt:
+            return prompt, self.responses["posts"]
+        if "Summarize the key findings" in prompt:
+            return prompt, self.responses["partial"]
+        return prompt, self.responses["summary"]
+
+
+class ReplayImageClient:
+    def __init__(self, image_url: str, latency: LatencyModel, **_):
+        """Stand-in for openai.OpenAI exposing images.generate()"""
+        self.images = SimpleNamespace(generate=self._generate)
+        self.image_url = image_url
+        self.latency = latency
+
+    def _generate(self, n: int = 1, **_):
+        self.latency.sleep("image_generate")
+        return SimpleNamespace(data=[SimpleNamespace(url=self.image_url, b64_json=None) for _ in range(n)])
+
+
+def load_openai_responses() -> Dict[str, str]:
+    return json.loads(load_fixture("openai_responses.json"))
+
+
+def _usage(prompt: str, content: str) -> dict:
+    input_tokens, output_tokens = count_tokens(prompt), count_tokens(content)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens}
+
+
+def _placeholder_png() -> bytes:
+    # Smallest valid 1x1 PNG, enough for downloads and decoders
+    return bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+        "1f15c4890000000d49444154789c6360606060000000050001a5f645400000000049454e44ae426082"
+    )
@@ -0,0 +1,264 @@
+"""End-to-end latency benchmark for ResearchCoordinator.run using recorded fixtures.
+
+Runs fully offline: SerpAPI, arXiv and OpenAI are replaced by stand-ins from
+benchmarks/replay.py that replay recorded responses with injected latency.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmark                    # compare against baseline
+    python -m benchmarks.run_benchmark --update-baseline  # record a new baseline
+    python -m benchmarks.run_benchmark --scenario concurrent --iterations 40
+
+Exits with status 1 when a metric regresses past the tolerance or a scenario
+has no baseline, and with status 2 when the latency settings differ from the
+ones the baseline was recorded with. --update-baseline with --scenario only
+replaces those scenarios' entries.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # Graph rendering must not need a display
+
+from agents.cache import ResultCache
+from agents.chart_renderer import enable_process_pool
+from agents.coordinator import ResearchCoordinator
+from agents.enrichment import FullTextEnricher
+from agents.image_store import ImageStore
+from agents.instrumentation import get_metrics
+from agents.rate_limit import QuotaManager, RateLimiter
+from benchmarks.replay import (LatencyModel, ReplayChatModel, ReplayHttpClient, ReplayImageClient,
+                               load_openai_responses)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TOPIC = "retrieval augmented generation"
+
+SCENARIOS = {
+    "default": {"concurrency": 1, "generate_images": True, "generate_graphs": True, "warm_cache": False},
+    "concurrent": {"concurrency": 4, "generate_images": True, "generate_graphs": True, "warm_cache": False},
+    "text_only": {"concurrency": 1, "generate_images": False, "generate_graphs": False, "warm_cache": False},
+    # Summary, posts and chart specs from one structured call instead of three
+    "fused": {"concurrency": 1, "generate_images": False, "generate_graphs": True, "warm_cache": False,
+              "fused": True},
+    # Full text of every kept source fetched and extracted before summarizing
+    "full_text": {"concurrency": 1, "generate_images": False, "generate_graphs": False, "warm_cache": False,
+                  "enrich": True},
+    "warm_cache": {"concurrency": 1, "generate_images": False, "generate_graphs": False, "warm_cache": True},
+}
+
+# Metrics compared against the baseline
+TRACKED = ("p50", "p95", "throughput")
+
+# Settings that shift every latency; a baseline recorded with other values can't be compared
+COMPARABLE_SETTINGS = ("latency_scale", "seed")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def build_coordinator(latency: LatencyModel, warm_cache: bool, fused: bool = False,
+                      enrich: bool = False) -> ResearchCoordinator:
+    responses = load_openai_responses()
+    # memory_size=0 turns the caches off so every run pays the full pipeline cost
+    memory_size = 256 if warm_cache else 0
+    http = ReplayHttpClient(latency)
+    return ResearchCoordinator(
+        cache=ResultCache(path=None, memory_size=memory_size),
+        llm_cache=ResultCache(path=None, memory_size=memory_size),
+        http=http,
+        # Keep benchmark images out of the real store under .cache/
+        image_store=ImageStore(root=tempfile.mkdtemp(prefix="benchmark_images_")),
+        # The replayed arXiv has no request quota, so don't space calls 3s apart
+        rate_limits={"arxiv": RateLimiter(60000)},
+        # Same for the replayed APIs; the limiters and ledger still run on every call
+        quota=QuotaManager(quotas={
+            "openai": {"calls_per_minute": 60000, "tokens_per_minute": 10 ** 9},
+            "openai_images": {"calls_per_minute": 60000},
+            "serpapi": {"calls_per_minute": 60000},
+        }),
+        chat_model_factory=lambda **kwargs: ReplayChatModel(responses, latency, **kwargs),
+        image_client_factory=lambda **kwargs: ReplayImageClient(responses["image_url"], latency, **kwargs),
+        fused=fused,
+        enrich=enrich,
+        # Cold pages unless the cache is warm: revalidate_after=0 refetches every time.
+        # Replayed hosts don't need politeness delays either.
+        enricher=FullTextEnricher(http=http, path=None, revalidate_after=3600 if warm_cache else 0,
+                                  host_calls_per_minute=60000, host_limits={"export.arxiv.org": 60000}),
+    )
+
+
+def run_scenario(name: str, iterations: int, warmup: int, latency_scale: float, seed: int,
+                 verbose: bool = False) -> Dict[str, float]:
+    """Run one scenario and return its latency and throughput figures"""
+    options = SCENARIOS[name]
+    latency = LatencyModel(scale=latency_scale, seed=seed)
+    coordinator = build_coordinator(latency, options["warm_cache"], options.get("fused", False),
+                                    options.get("enrich", False))
+    metrics = get_metrics()
+
+    def run_once(_) -> float:
+        started = time.perf_counter()
+        coordinator.run(
+            TOPIC,
+            openai_api_key="benchmark",
+            serp_api_key="benchmark",
+            generate_images=options["generate_images"],
+            generate_graphs=options["generate_graphs"]
+        )
+        return time.perf_counter() - started
+
+    output = sys.stdout if verbose else io.StringIO()
+    with redirect_stdout(output):
+        for i in range(warmup):
+            run_once(i)
+        metrics.reset()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            latencies = list(executor.map(run_once, range(iterations)))
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "iterations": iterations,
+        "concurrency": options["concurrency"],
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "mean": sum(latencies) / len(latencies),
+        "throughput": iterations / elapsed,
+        "stages": stage_breakdown(metrics.spans()),
+    }
+    return report
+
+
+def stage_breakdown(spans: List[dict]) -> Dict[str, dict]:
+    durations: Dict[str, List[float]] = {}
+    for span in spans:
+        if span["span"].startswith("stage."):
+            durations.setdefault(span["span"][len("stage."):], []).append(span["duration"])
+    return {
+        stage: {"p50": percentile(values, 50), "p95": percentile(values, 95), "count": len(values)}
+        for stage, values in sorted(durations.items())
+    }
+
+
+def compare(report: Dict[str, float], baseline: Dict[str, float], tolerance: float,
+            min_delta: float) -> List[str]:
+    """Return a message for every tracked metric that regressed beyond tolerance.
+
+    A slowdown must exceed both the relative tolerance and min_delta seconds,
+    so sub-millisecond jitter in fast scenarios isn't reported.
+    """
+    regressions = []
+    for metric in TRACKED:
+        if not baseline.get(metric):
+            continue
+        current, previous = report[metric], baseline[metric]
+        if metric == "throughput":
+            # Compare as seconds per run so the same absolute floor applies
+            current, previous = 1 / current, 1 / previous
+        if current - previous > max(tolerance * previous, min_delta):
+            change = (report[metric] - baseline[metric]) / baseline[metric]
+            regressions.append(
+                f"{metric}: {report[metric]:.3f} vs baseline {baseline[metric]:.3f} ({change:+.0%})"
+            )
+    return regressions
+
+
+def print_report(name: str, report: Dict[str, float]):
+    print(f"\n== {name} ({report['iterations']} runs, concurrency {report['concurrency']}) ==")
+    print(f"  end-to-end p50 {report['p50']:.3f}s  p95 {report['p95']:.3f}s  mean {report['mean']:.3f}s")
+    print(f"  throughput {report['throughput']:.2f} runs/s")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:<10} p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s  (n={stats['count']})")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the research pipeline.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run; repeat for several (default: all)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--latency-scale", type=float, default=0.05,
+                        help="Multiplier on recorded provider latencies (1.0 = real time)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative regression before failing")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this many seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Show agent log output")
+    args = parser.parse_args(argv)
+    enable_process_pool()  # As in batch.py and the app
+
+    reports = {}
+    for name in args.scenario or sorted(SCENARIOS):
+        reports[name] = run_scenario(name, args.iterations, args.warmup, args.latency_scale,
+                                     args.seed, args.verbose)
+        print_report(name, reports[name])
+    # ru_maxrss (kilobytes on Linux) is the high-water mark of the whole process, not of one scenario
+    print(f"\nPeak RSS over all scenarios: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    settings = {"iterations": args.iterations, "latency_scale": args.latency_scale, "seed": args.seed}
+    recorded = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            recorded = json.load(f)
+    mismatched = [key for key in COMPARABLE_SETTINGS
+                  if recorded and recorded["settings"].get(key) != settings[key]]
+
+    if args.update_baseline:
+        # Re-recording some scenarios keeps the others, as long as they were measured the same way
+        scenarios = dict(recorded["scenarios"]) if recorded and not mismatched else {}
+        scenarios.update(reports)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "scenarios": scenarios}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if recorded is None:
+        print("\nNo baseline found; run with --update-baseline to record one.")
+        return 0
+
+    if mismatched:
+        for key in mismatched:
+            print(f"SETTINGS MISMATCH {key}: {settings[key]} vs baseline {recorded['settings'].get(key)}")
+        print("Results can't be compared; rerun with the baseline's settings or record a new baseline.")
+        return 2
+    if recorded["settings"].get("iterations") != settings["iterations"]:
+        print(f"WARNING: {settings['iterations']} iterations vs {recorded['settings'].get('iterations')} "
+              "in the baseline; percentiles are less comparable")
+
+    baseline = recorded["scenarios"]
+    failed = False
+    for name, report in reports.items():
+        if name not in baseline:
+            print(f"MISSING BASELINE [{name}] run with --update-baseline --scenario {name} to record it")
+            failed = True
+            continue
+        regressions = compare(report, baseline[name], args.tolerance, args.min_delta)
+        for message in regressions:
+            print(f"REGRESSION [{name}] {message}")
+        failed = failed or bool(regressions)
+
+    if not failed:
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of baseline.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())